@@ -1,9 +1,22 @@
-
+import os
+import uuid
 import streamlit as st
-import pandas as pd
-import joblib
-from io import BytesIO
-from fpdf import FPDF
+from startup import StartupTimer
+
+# Only lightweight modules are imported up front; pandas, joblib, sklearn and fpdf
+# are imported by the step that first needs them (see startup.py to profile this)
+startup_timer = StartupTimer()
+with startup_timer.stage("imports"):
+    import metrics
+    from model_loader import ModelLoadError, get_loader, load_model
+    from features import load_schema
+    from scoring import score
+    from prediction_cache import PredictionCache, prediction_cache
+    from tree_engine import accelerate
+
+# Per-stage latency metrics: HEALTHCARE_METRICS_PORT serves them at /metrics,
+# HEALTHCARE_METRICS_FILE writes them for a textfile collector
+metrics.start_from_env()
 
 # Set page configuration
 st.set_page_config(
@@ -58,18 +71,110 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Load the trained model
-model_path = 'healthcare_model.pkl'  # Ensure this path is correct
-try:
-    model = joblib.load
-    st.success("Model loaded successfully!")
-except FileNotFoundError:
-    st.error(f"Model file not found: {model_path}")
-    st.stop()
+# Load the trained model (deserialized once per process, reloaded when the file changes).
+# When HEALTHCARE_INFERENCE_URL points at inference_server.py, scoring is delegated to it
+# so every replica on the node shares one model copy.
+# HEALTHCARE_MODEL_PATH can point at a memory-mapped .hcm artifact (model_artifact.py),
+# which every worker on the node maps instead of unpickling its own copy.
+model_path = os.environ.get("HEALTHCARE_MODEL_PATH", 'healthcare_model.pkl')  # Ensure this path is correct
+inference_url = os.environ.get("HEALTHCARE_INFERENCE_URL")
+# HEALTHCARE_STARTUP=lazy defers loading the model (and importing sklearn) until the
+# Diagnosis step, so a freshly started worker renders its first page sooner
+startup_mode = os.environ.get("HEALTHCARE_STARTUP", "eager")
+
+
+def load_serving_model():
+    """Return (model, schema, model_version, inference_client) for the diagnosis step."""
+    inference_client = None
+    model = None
+    model_version = None
+    if inference_url:
+        from inference_server import get_client
+
+        inference_client = get_client(inference_url)
+        try:
+            # Pick up a hot reload on the server so cached predictions of the old model are not reused
+            inference_client.refresh()
+            schema = inference_client.schema
+            model_version = inference_client.version
+            st.success(f"Connected to inference server at {inference_url}")
+        except (OSError, RuntimeError) as e:
+            st.error(f"Inference server unavailable at {inference_url}: {e}")
+            schema = load_schema(model_path)
+    else:
+        try:
+            # Single-row scoring goes through the flattened tree engine when the model supports it
+            model = accelerate(load_model(model_path))
+            # Build the per-leaf attribution tables now rather than on the first diagnosis
+            from explain import get_explainer
+
+            get_explainer(model)
+            model_stats = get_loader(model_path).stats()
+            model_version = model_stats["version"]
+            # Drop cached predictions as soon as a new model version is loaded
+            get_loader(model_path).add_listener(prediction_cache.invalidate)
+            st.success(
+                f"Model loaded successfully! (load time: {model_stats['load_seconds'] * 1000:.0f} ms, "
+                f"memory: {(model_stats['memory_bytes'] or 0) / 1024:.0f} KiB)"
+            )
+        except FileNotFoundError:
+            st.error(f"Model file not found: {model_path}")
+            st.stop()
+        except ModelLoadError as e:
+            # Keep the rest of the app usable; the diagnosis step reports the missing model
+            st.error(str(e))
+        schema = load_schema(model_path, model)
+    return model, schema, model_version, inference_client
+
+
+if startup_mode != "lazy":
+    with startup_timer.stage("model"):
+        model, schema, model_version, inference_client = load_serving_model()
+
+# Patient history lives in a local SQLite store (patient_store.py). Saves run on the
+# store's writer thread; the script waits only briefly, and a save that has not
+# committed by then is reported on a later rerun.
+patient_db = os.environ.get("HEALTHCARE_PATIENT_DB", "patients.db")
+
+
+def get_patient_store():
+    from patient_store import get_store
+
+    return get_store(patient_db)
+
+
+def save_visit(details):
+    from concurrent.futures import TimeoutError
+
+    try:
+        future = get_patient_store().save_visit(dict(details))
+    except ValueError as e:
+        st.warning(f"⚠️ Could not save the visit: {e}")
+        return
+    try:
+        future.result(timeout=0.2)
+    except TimeoutError:
+        # Still queued behind other writes (e.g. a bulk import); reported on a later rerun
+        st.session_state["pending_save"] = future
+        st.info("💾 Saving the visit...")
+    except Exception as e:
+        st.error(f"Saving the visit failed: {e}")
+    else:
+        st.success("💾 Visit saved to the patient record.")
+
+
+pending_save = st.session_state.get("pending_save")
+if pending_save is not None and pending_save.done():
+    del st.session_state["pending_save"]
+    if pending_save.exception() is not None:
+        st.error(f"Saving the last visit failed: {pending_save.exception()}")
+    else:
+        st.success("💾 The last visit was saved to the patient record.")
 
 # Initialize session state
 if "patient_details" not in st.session_state:
     st.session_state["patient_details"] = {
+        "patient_id": "",
         "full_name": "",
         "age": 30,
         "gender": "Male",
@@ -105,9 +210,33 @@ step = st.radio(
 # Step 1: Patient Information
 if step == "Patient Information":
     st.markdown("### Step 1: Patient Information")
-    st.session_state["patient_details"]["full_name"] = st.text_input("Full Name", st.session_state["patient_details"]["full_name"])
-    st.session_state["patient_details"]["age"] = st.number_input("Age", min_value=0, max_value=120, value=st.session_state["patient_details"]["age"])
-    st.session_state["patient_details"]["gender"] = st.selectbox("Gender", ["Male", "Female"], index=0 if st.session_state["patient_details"]["gender"] == "Male" else 1)
+    st.session_state["patient_details"]["patient_id"] = st.text_input("Patient ID (optional)", st.session_state["patient_details"].get("patient_id", ""))
+    # Loading a visit bumps the generation, giving the widgets below fresh keys so their
+    # previous (edited) state cannot override the loaded values
+    generation = st.session_state.setdefault("visit_generation", 0)
+    st.session_state["patient_details"]["full_name"] = st.text_input("Full Name", st.session_state["patient_details"]["full_name"], key=f"full_name_{generation}")
+
+    # Returning patients: start from their last recorded visit instead of re-entering everything
+    if st.button("📂 Load last visit"):
+        from patient_store import patient_key
+
+        latest = get_patient_store().latest(patient_key(st.session_state["patient_details"]))
+        if latest is None:
+            st.info("No saved visits for this patient yet.")
+        else:
+            visit_date = latest.pop("visit_date")
+            if not latest["full_name"]:
+                latest.pop("full_name")
+            st.session_state["patient_details"].update(latest)
+            st.session_state["visit_generation"] = generation + 1
+            # Shown after the rerun; a message rendered now would be discarded by it
+            st.session_state["loaded_visit_message"] = f"Loaded the visit from {visit_date}."
+            st.rerun()
+    loaded_visit_message = st.session_state.pop("loaded_visit_message", None)
+    if loaded_visit_message:
+        st.success(loaded_visit_message)
+    st.session_state["patient_details"]["age"] = st.number_input("Age", min_value=0, max_value=120, value=st.session_state["patient_details"]["age"], key=f"age_{generation}")
+    st.session_state["patient_details"]["gender"] = st.selectbox("Gender", ["Male", "Female"], index=0 if st.session_state["patient_details"]["gender"] == "Male" else 1, key=f"gender_{generation}")
 
 # Step 2: Health Metrics
 elif step == "Health Metrics":
@@ -199,64 +328,80 @@ elif step == "Diabetes Tracker":
         st.session_state["patient_details"]["hba1c"] = hba1c
 
     # Analyze Diabetes Risk
+    # Same rule engine as population screening (screening.py), so thresholds cannot drift
     if st.button("Analyze Diabetes Risk"):
-        if fasting_sugar >= 126 or post_meal_sugar >= 200 or hba1c >= 6.5:
+        from screening import diabetes_risk
+
+        risk = int(diabetes_risk(fasting_sugar, post_meal_sugar, hba1c))
+        if risk == 2:
             st.error("🚨 High risk of diabetes. Consult a doctor immediately.")
-        elif 100 <= fasting_sugar < 126 or 140 <= post_meal_sugar < 200 or 5.7 <= hba1c < 6.5:
+        elif risk == 1:
             st.warning("⚠️ Prediabetes detected. Lifestyle changes are recommended.")
         else:
             st.success("✅ Normal blood sugar levels. Keep up the healthy lifestyle!")
 
+    if st.button("💾 Save today's readings"):
+        save_visit(st.session_state["patient_details"])
+
+    # Trends from the patient's saved visits (one indexed range scan per rerun)
+    from patient_store import patient_key
+
+    key = patient_key(st.session_state["patient_details"])
+    if key:
+        import datetime
+
+        periods = {"Last 90 days": 90, "Last year": 365, "All visits": None}
+        period = st.selectbox("Trend period", list(periods))
+        start = datetime.date.today() - datetime.timedelta(days=periods[period]) if periods[period] else None
+        series = get_patient_store().series(key, start=start)
+        if series["visit_date"]:
+            st.markdown("#### Blood Sugar Trends")
+            st.line_chart(series, x="visit_date", y=["fasting_blood_sugar", "post_meal_blood_sugar"])
+            st.line_chart(series, x="visit_date", y=["hba1c"])
+        else:
+            st.info("No saved readings in this period yet.")
+
 
 # Step 5: Diagnosis & Treatment
 elif step == "Diagnosis & Treatment":
     st.markdown("### Step 5: Diagnosis & Treatment")
     st.session_state["patient_details"]["symptoms"] = st.text_area("Symptoms", st.session_state["patient_details"]["symptoms"])
+    if startup_mode == "lazy":
+        with startup_timer.stage("model"):
+            model, schema, model_version, inference_client = load_serving_model()
+    if model is None and inference_client is None:
+        st.error(f"No diagnosis is available: the model at {model_path} could not be loaded.")
+        st.stop()
 
-    # Prepare input data for prediction
-    input_data = pd.DataFrame({
-        "age": [st.session_state["patient_details"]["age"]],
-        "gender": [1 if st.session_state["patient_details"]["gender"] == "Female" else 0],
-        "blood_pressure": [st.session_state["patient_details"]["blood_pressure"]],
-        "cholesterol": [st.session_state["patient_details"]["cholesterol"]],
-        "bmi": [st.session_state["patient_details"]["bmi"]],
-        "glucose": [st.session_state["patient_details"]["glucose"]],
-        "smoking_status": [1 if st.session_state["patient_details"]["smoking_status"] == "Smoker" else 0],
-        "alcohol_consumption_light": [1 if st.session_state["patient_details"]["alcohol_consumption"] == "Light" else 0],
-        "alcohol_consumption_moderate": [1 if st.session_state["patient_details"]["alcohol_consumption"] == "Moderate" else 0],
-        "alcohol_consumption_heavy": [1 if st.session_state["patient_details"]["alcohol_consumption"] == "Heavy" else 0],
-        "physical_activity_light": [1 if st.session_state["patient_details"]["physical_activity"] == "Light" else 0],
-        "physical_activity_moderate": [1 if st.session_state["patient_details"]["physical_activity"] == "Moderate" else 0],
-        "physical_activity_heavy": [1 if st.session_state["patient_details"]["physical_activity"] == "Heavy" else 0],
-        "family_history": [1 if st.session_state["patient_details"]["family_history"] == "Yes" else 0],
-        "diet_unbalanced": [1 if st.session_state["patient_details"]["diet"] == "Unbalanced" else 0],
-        "diet_vegetarian": [1 if st.session_state["patient_details"]["diet"] == "Vegetarian" else 0],
-        "diet_vegan": [1 if st.session_state["patient_details"]["diet"] == "Vegan" else 0],
-        "sleep_hours": [st.session_state["patient_details"]["sleep_hours"]],
-        "stress_level_moderate": [1 if st.session_state["patient_details"]["stress_level"] == "Moderate" else 0],
-        "stress_level_high": [1 if st.session_state["patient_details"]["stress_level"] == "High" else 0],
-        "heart_rate": [st.session_state["patient_details"]["heart_rate"]],
-        "oxygen_saturation": [st.session_state["patient_details"]["oxygen_saturation"]],
-        "waist_circumference": [st.session_state["patient_details"]["waist_circumference"]],
-        "hip_circumference": [st.session_state["patient_details"]["hip_circumference"]],
-        "fasting_blood_sugar": [st.session_state["patient_details"]["fasting_blood_sugar"]],
-        "post_meal_blood_sugar": [st.session_state["patient_details"]["post_meal_blood_sugar"]],
-        "hba1c": [st.session_state["patient_details"]["hba1c"]]
-    })
-
-    if not isinstance(input_data, pd.DataFrame):
-        input_data = pd.DataFrame(input_data)
-
-    if hasattr(model, 'feature_names_in_'):
-        feature_names = model.feature_names_in_
-    else:
-        feature_names = input_data.columns
+    try:
+        # Encode the patient into a preallocated feature row (same schema as training and batch scoring)
+        with metrics.span("encode"):
+            # One buffer per session (every rerun runs on a new thread); a reloaded schema may change its width
+            feature_row = st.session_state.get("feature_row")
+            if feature_row is None or feature_row.shape != (1, len(schema.columns)):
+                feature_row = st.session_state["feature_row"] = schema.row_buffer()
+            input_data = schema.encode_one(st.session_state["patient_details"], out=feature_row)
+
+        # Reruns with unchanged inputs (e.g. typing symptoms) reuse the cached prediction
+        cache_key = PredictionCache.key(input_data, model_version)
+        # The top contributing fields are cached with the prediction; the inference
+        # server returns predictions only, so remote scoring shows no explanation
+        if inference_client is not None:
+            patient = dict(st.session_state["patient_details"])
+            compute = lambda: (*inference_client.score_records([patient]), None)
+        else:
+            from drift_monitor import get_monitor
+            from explain import top_factors
 
-    input_data = input_data.reindex(columns=feature_names, fill_value=0)
+            def compute():
+                # Only newly scored rows reach the drift monitor, not reruns served from the cache
+                monitor = get_monitor(model_path)
+                if monitor is not None:
+                    monitor.observe(input_data)
+                return (*score(model, input_data), top_factors(model, schema, input_data))
 
-    try:
-        prediction = model.predict(input_data)
-        prediction_proba = model.predict_proba(input_data)
+        with metrics.span("predict"):
+            prediction, prediction_proba, factors = prediction_cache.get_or_compute(cache_key, compute)
 
         if prediction[0] == 1:
             st.markdown("### Diagnosis: High Risk of Disease ❌")
@@ -265,69 +410,24 @@ elif step == "Diagnosis & Treatment":
             st.markdown("### Diagnosis: Low Risk of Disease ✅")
             st.success(f"Low Risk Probability: {prediction_proba[0][0]:.2f}")
 
-        # Generate PDF Report
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # Title
-        pdf.set_font("Arial", style="BU", size=12)
-        pdf.cell(200, 10, txt="Healthcare Analysis Report", ln=True, align="C")
-        pdf.set_font("Arial", size=12)
-        pdf.ln(10)
-
-        # Patient Information
-        pdf.cell(200, 10, txt="Patient Information:", ln=True)
-        pdf.cell(200, 10, txt=f"Full Name: {st.session_state['patient_details'].get('full_name', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Age: {st.session_state['patient_details'].get('age', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Gender: {st.session_state['patient_details'].get('gender', 'N/A')}", ln=True)
-        pdf.ln(10)
-
-        # Health Metrics
-        pdf.cell(200, 10, txt="Health Metrics:", ln=True)
-        pdf.cell(200, 10, txt=f"Blood Pressure: {st.session_state['patient_details'].get('blood_pressure', 'N/A')} mmHg", ln=True)
-        pdf.cell(200, 10, txt=f"Cholesterol: {st.session_state['patient_details'].get('cholesterol', 'N/A')} mg/dL", ln=True)
-        pdf.cell(200, 10, txt=f"BMI: {st.session_state['patient_details'].get('bmi', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Glucose Level: {st.session_state['patient_details'].get('glucose', 'N/A')} mg/dL", ln=True)
-        pdf.cell(200, 10, txt=f"Heart Rate: {st.session_state['patient_details'].get('heart_rate', 'N/A')} bpm", ln=True)
-        pdf.cell(200, 10, txt=f"Oxygen Saturation: {st.session_state['patient_details'].get('oxygen_saturation', 'N/A')} %", ln=True)
-        pdf.ln(10)
-
-        # Lifestyle Habits
-        pdf.cell(200, 10, txt="Lifestyle Habits:", ln=True)
-        pdf.cell(200, 10, txt=f"Smoking Status: {st.session_state['patient_details'].get('smoking_status', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Alcohol Consumption: {st.session_state['patient_details'].get('alcohol_consumption', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Physical Activity: {st.session_state['patient_details'].get('physical_activity', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Family History: {st.session_state['patient_details'].get('family_history', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Diet: {st.session_state['patient_details'].get('diet', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Sleep Hours: {st.session_state['patient_details'].get('sleep_hours', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Stress Level: {st.session_state['patient_details'].get('stress_level', 'N/A')}", ln=True)
-        pdf.cell(200, 10, txt=f"Waist Circumference: {st.session_state['patient_details'].get('waist_circumference', 'N/A')} cm", ln=True)
-        pdf.cell(200, 10, txt=f"Hip Circumference: {st.session_state['patient_details'].get('hip_circumference', 'N/A')} cm", ln=True)
-        pdf.ln(10)
-
-        # Diabetes Tracker
-        pdf.cell(200, 10, txt="Diabetes Tracker:", ln=True)
-        pdf.cell(200, 10, txt=f"Fasting Blood Sugar: {st.session_state['patient_details'].get('fasting_blood_sugar', 'N/A')} mg/dL", ln=True)
-        pdf.cell(200, 10, txt=f"Post-Meal Blood Sugar: {st.session_state['patient_details'].get('post_meal_blood_sugar', 'N/A')} mg/dL", ln=True)
-        pdf.cell(200, 10, txt=f"HbA1c: {st.session_state['patient_details'].get('hba1c', 'N/A')} %", ln=True)
-        pdf.ln(10)
-
-        # Diagnosis Results
-        pdf.cell(200, 10, txt="Diagnosis Results:", ln=True)
-        pdf.cell(200, 10, txt=f"Diagnosis: {'High Risk of Disease' if prediction[0] == 1 else 'Low Risk of Disease'}", ln=True)
-        pdf.cell(200, 10, txt=f"Low Risk Probability: {prediction_proba[0][0]:.2f}", ln=True)
-        pdf.cell(200, 10, txt=f"High Risk Probability: {prediction_proba[0][1]:.2f}", ln=True)
-
-        # Save PDF to buffer
-        buffer = BytesIO()
-        pdf_output = pdf.output(dest="S").encode("latin1")  # Encode the PDF content
-        buffer.write(pdf_output)
-        buffer.seek(0)
+        from report import field_label
+
+        if factors:
+            st.markdown("**Main factors behind this result** (contribution to the risk log-odds):")
+            st.markdown("\n".join(
+                f"- {'🔺' if value > 0 else '🔻'} {field_label(name)}: {value:+.2f}" for name, value in factors
+            ))
+
+        # PDF report: rendered only when the button is clicked, and reused while
+        # the patient data and prediction are unchanged
+        report_patient = dict(st.session_state["patient_details"])
+        report_label = int(prediction[0])
+        report_proba = prediction_proba[0]
+        from report import render_report
 
         st.download_button(
             label="Download Report as PDF",
-            data=buffer,
+            data=lambda: render_report(report_patient, report_label, report_proba, factors or ()),
             file_name="healthcare_analysis_report.pdf",
             mime="application/pdf"
         )
@@ -374,6 +474,9 @@ elif step == "Final Report":
     st.write(f"**Diagnosis:** {patient_details['diagnosis']}")
     st.write(f"**Treatment:** {patient_details['treatment']}")
 
+    if st.button("💾 Save visit"):
+        save_visit(patient_details)
+
 # Footer
 st.markdown(
     """
@@ -388,57 +491,33 @@ st.markdown(
 st.sidebar.markdown("## 🤖 AI Healthcare Chatbot")
 
 # --- Initialize Chat History & Session Variables ---
-if "chat_messages" not in st.session_state:
-    st.session_state["chat_messages"] = [
-        {"role": "bot", "content": "👋 Hello! You can speak or type your question.\n\n**📌 Categories:**\n- Disease Diagnosis 🩺\n- Treatment Recommendations 💊\n- Health Tips 🍎\n- Symptom Checker 🤒\n- Mental Health Support 🧠"}
-    ]
+# Chat history is a bounded ring buffer (chat_history.py); with HEALTHCARE_CHAT_SPILL=1,
+# messages it evicts are kept in the patient store and shown again page by page.
+if "chat_history" not in st.session_state:
+    from chat_history import ChatHistory
+
+    spill = os.environ.get("HEALTHCARE_CHAT_SPILL", "0") not in ("", "0")
+    st.session_state["chat_history"] = ChatHistory(
+        capacity=int(os.environ.get("HEALTHCARE_CHAT_CAPACITY", "200")),
+        store=get_patient_store() if spill else None,
+        session=uuid.uuid4().hex,
+    )
+    st.session_state["chat_history"].append("bot", "👋 Hello! You can speak or type your question.\n\n**📌 Categories:**\n- Disease Diagnosis 🩺\n- Treatment Recommendations 💊\n- Health Tips 🍎\n- Symptom Checker 🤒\n- Mental Health Support 🧠")
+chat_history = st.session_state["chat_history"]
 if "last_topic" not in st.session_state:
     st.session_state["last_topic"] = None  # Track conversation topic
 if "user_input" not in st.session_state:
     st.session_state["user_input"] = ""  # Track the input field value
 
-# --- Smarter Chatbot Response System ---
-def chatbot_response(user_message):
-    user_message = user_message.lower().strip()
-
-    # Standard Greetings
-    greetings = ["hello", "hi", "hey", "how are you"]
-    if user_message in greetings:
-        return "👋 Hello! How can I assist you today? You can ask about disease diagnosis, treatment, or health tips!"
-
-    # Disease Diagnosis
-    if "diagnosis" in user_message or "disease" in user_message:
-        st.session_state["last_topic"] = "diagnosis"
-        return "🩺 **Disease Diagnosis:**\n- **Symptoms:** Describe your symptoms for a preliminary diagnosis.\n- **Risk Factors:** Provide your health metrics for a detailed analysis."
-
-    # Treatment Recommendations
-    if "treatment" in user_message or "medicine" in user_message:
-        st.session_state["last_topic"] = "treatment"
-        return "💊 **Treatment Recommendations:**\n- **Medications:** Based on your diagnosis, we can recommend medications.\n- **Lifestyle Changes:** Suggestions for diet, exercise, and other lifestyle changes."
-
-    # Health Tips
-    if "health tips" in user_message or "healthy living" in user_message:
-        st.session_state["last_topic"] = "health tips"
-        return "🍎 **Health Tips:**\n- **Diet:** Eat a balanced diet rich in fruits and vegetables.\n- **Exercise:** Regular physical activity is essential.\n- **Sleep:** Ensure 7-9 hours of sleep per night."
-
-    # Symptom Checker
-    if "symptom" in user_message or "checker" in user_message:
-        st.session_state["last_topic"] = "symptom checker"
-        return "🤒 **Symptom Checker:**\n- **Common Symptoms:** Fever, cough, headache, etc.\n- **Severe Symptoms:** Chest pain, difficulty breathing, etc."
-
-    # Mental Health Support
-    if "mental health" in user_message or "stress" in user_message:
-        st.session_state["last_topic"] = "mental health"
-        return "🧠 **Mental Health Support:**\n- **Counseling:** Seek professional help if needed.\n- **Relaxation Techniques:** Practice mindfulness and meditation."
-
-    # Default Response
-    return "🤖 Hmm, I don't have an exact answer for that. Try asking about disease diagnosis, treatment, or health tips!"
-
 # --- Display Chat History ---
 st.sidebar.markdown("### 💬 Chat History:")
-for message in st.session_state["chat_messages"]:
-    role = "👤 You" if message["role"] == "user" else "🤖 Bot"
-    st.sidebar.markdown(f"**{role}:** {message['content']}")
+older_pages = chat_history.page_count()
+if older_pages:
+    with st.sidebar.expander(f"🕘 Earlier messages ({chat_history.older_count})"):
+        page = st.number_input("Page (1 = most recent)", min_value=1, max_value=older_pages, value=1, key="chat_page")
+        st.markdown(chat_history.page_markdown(older_pages - min(int(page), older_pages)))
+# Only the recent window is rendered on each rerun, as one cached block
+st.sidebar.markdown(chat_history.window_markdown())
 
 # --- Text Input Field for Manual Chat ---
 user_input = st.sidebar.text_input("💬 Type your question:", value=st.session_state["user_input"], key="chat_input")
@@ -447,11 +526,13 @@ user_input = st.sidebar.text_input("💬 Type your question:", value=st.session_
 if st.sidebar.button("🚀 Send"):
     if user_input.strip():
         # Add user input to chat history
-        st.session_state["chat_messages"].append({"role": "user", "content": user_input})
+        chat_history.append("user", user_input)
         
         # Get bot response
-        bot_reply = chatbot_response(user_input)
-        st.session_state["chat_messages"].append({"role": "bot", "content": bot_reply})
+        from chatbot import chatbot_response
+
+        bot_reply = chatbot_response(user_input, st.session_state)
+        chat_history.append("bot", bot_reply)
         
         # Clear input field by resetting session state
         st.session_state["user_input"] = ""  
@@ -467,15 +548,17 @@ if st.session_state["bmi_active"]:
     height = st.sidebar.number_input("Height (cm)", min_value=50.0, value=170.0, step=0.1)
 
     if st.sidebar.button("📊 Calculate BMI"):
-        height_m = height / 100
-        bmi = round(weight / (height_m ** 2), 2)
+        from screening import bmi_category, bmi as compute_bmi
+
+        bmi = float(compute_bmi(weight, height))
         st.sidebar.success(f"📌 Your BMI: {bmi}")
 
-        if bmi < 18.5:
+        category = int(bmi_category(bmi))
+        if category == 0:
             st.sidebar.warning("Underweight: Consider consulting a nutritionist.")
-        elif 18.5 <= bmi < 24.9:
+        elif category == 1:
             st.sidebar.success("Normal weight: Keep up the good work!")
-        elif 25 <= bmi < 29.9:
+        elif category == 2:
             st.sidebar.warning("Overweight: Consider a balanced diet and exercise.")
         else:
             st.sidebar.error("Obese: Please consult a healthcare professional.")
@@ -483,3 +566,14 @@ if st.session_state["bmi_active"]:
         st.session_state["bmi_active"] = False  # Reset BMI trigger        
         # Refresh UI to show cleared input field
         st.rerun()
+
+# --- Startup profile (HEALTHCARE_PROFILE_STARTUP=1) ---
+if os.environ.get("HEALTHCARE_PROFILE_STARTUP"):
+    with st.sidebar.expander("⏱️ Startup profile"):
+        for stage in startup_timer.stages:
+            st.write(f"**{stage['stage']}:** {stage['seconds'] * 1000:.1f} ms")
+        st.write(f"**Script run:** {startup_timer.total * 1000:.1f} ms")
+        st.write(f"**Heavy modules loaded:** {', '.join(startup_timer.heavy_modules()) or 'none'}")
+
+# Whole script run (one Streamlit request); runs that end in st.rerun() are not recorded
+metrics.observe("script_run", startup_timer.total)
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+DEFAULT_PATIENT = {
+    "full_name": "Benchmark Patient",
+    "age": 52,
+    "gender": "Female",
+    "blood_pressure": 138,
+    "cholesterol": 231,
+    "bmi": 28.4,
+    "glucose": 118,
+    "smoking_status": "Smoker",
+    "alcohol_consumption": "Moderate",
+    "physical_activity": "Light",
+    "family_history": "Yes",
+    "symptoms": "fatigue, thirst",
+    "diagnosis": "",
+    "treatment": "",
+    "diet": "Unbalanced",
+    "sleep_hours": 6,
+    "stress_level": "High",
+    "heart_rate": 81,
+    "oxygen_saturation": 96,
+    "waist_circumference": 98,
+    "hip_circumference": 104,
+    "fasting_blood_sugar": 112,
+    "post_meal_blood_sugar": 168,
+    "hba1c": 6.1,
+}
+
+CHAT_MESSAGES = [
+    "hello",
+    "Can you help with a diagnosis?",
+    "what treatment or medicine do you recommend",
+    "any health tips for healthy living?",
+    "I want to use the symptom checker",
+    "I feel a lot of stress lately",
+    "what is the weather like",
+]
+
+
+def synthetic_cohort(n, seed=0):
+    """`n` patient records around DEFAULT_PATIENT with every category represented."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "age": rng.integers(18, 90, n),
+        "gender": rng.choice(["Male", "Female"], n),
+        "blood_pressure": rng.integers(90, 180, n),
+        "cholesterol": rng.integers(140, 300, n),
+        "bmi": rng.normal(26, 4, n).round(1),
+        "glucose": rng.integers(70, 200, n),
+        "smoking_status": rng.choice(["Non-smoker", "Smoker"], n),
+        "alcohol_consumption": rng.choice(["None", "Light", "Moderate", "Heavy"], n),
+        "physical_activity": rng.choice(["None", "Light", "Moderate", "Heavy"], n),
+        "family_history": rng.choice(["No", "Yes"], n),
+        "diet": rng.choice(["Balanced", "Unbalanced", "Vegetarian", "Vegan"], n),
+        "sleep_hours": rng.integers(4, 10, n),
+        "stress_level": rng.choice(["Low", "Moderate", "High"], n),
+        "heart_rate": rng.integers(50, 110, n),
+        "oxygen_saturation": rng.integers(90, 100, n),
+        "waist_circumference": rng.integers(60, 130, n),
+        "hip_circumference": rng.integers(80, 140, n),
+        "fasting_blood_sugar": rng.integers(60, 220, n),
+        "post_meal_blood_sugar": rng.integers(80, 320, n),
+        "hba1c": rng.uniform(4.0, 11.0, n).round(1),
+    })
+
+
+def measure(fn, repeat, warmup=1, items=1, min_seconds=0.0):
+    """Time `fn` and summarize latency percentiles, throughput and peak memory.
+
+    `items` is how many rows/messages one call processes, so throughput is in
+    items per second. Peak memory comes from one extra traced call, kept out
+    of the timed runs because tracing slows allocation-heavy code.
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - start < min_seconds:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = np.array(timings)
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99])
+    return {
+        "runs": len(timings),
+        "items_per_run": items,
+        "mean_ms": timings.mean() * 1e3,
+        "p50_ms": p50 * 1e3,
+        "p90_ms": p90 * 1e3,
+        "p99_ms": p99 * 1e3,
+        "throughput_per_s": items / timings.mean(),
+        "peak_memory_bytes": peak,
+    }
+
+
+def build_cases(model_path, rows, only=None):
+    """Name -> (callable, repeat, items) for the cases in `only` (default: all).
+
+    Only the fixtures the selected cases need are built. Model cases are
+    skipped if the model cannot be loaded; it is loaded like the app does, so
+    pickles and .hcm artifacts both work.
+    """
+    import pandas as pd
+
+    from features import load_schema
+    from model_loader import _default_load
+
+    def wanted(*names):
+        return only is None or any(name in only for name in names)
+
+    cases = {}
+    errors = {}
+
+    model_cases = ["predict_proba_single", "predict_proba_batch", "compiled_predict_proba_single",
+                   "compiled_predict_proba_batch", "explain_single", "explain_batch"]
+    if wanted("model_load"):
+        cases["model_load"] = (lambda: _default_load(model_path), 20, 1)
+    model = None
+    if wanted(*model_cases):
+        try:
+            model = _default_load(model_path)
+        except Exception as e:
+            errors["model"] = f"{type(e).__name__}: {e}"
+
+    schema = load_schema(model_path, model)
+    cohort = synthetic_cohort(rows) if wanted("feature_frame_batch", "screening_batch", *model_cases) else None
+    if wanted("feature_row_preallocated"):
+        cases["feature_row_preallocated"] = (lambda: schema.encode_one(DEFAULT_PATIENT), 2000, 1)
+    if wanted("feature_frame_dataframe"):
+        cases["feature_frame_dataframe"] = (lambda: schema.encode_frame(pd.DataFrame([DEFAULT_PATIENT])), 500, 1)
+    if wanted("feature_frame_batch"):
+        cases["feature_frame_batch"] = (lambda: schema.encode_frame(cohort), 10, rows)
+
+    if model is not None and wanted(*model_cases):
+        from tree_engine import accelerate
+
+        row = schema.encode_frame(pd.DataFrame([DEFAULT_PATIENT]))
+        batch = schema.encode_frame(cohort)
+        cases["predict_proba_single"] = (lambda: model.predict_proba(row), 300, 1)
+        cases["predict_proba_batch"] = (lambda: model.predict_proba(batch), 10, rows)
+        engine = accelerate(model)
+        row_array = row.to_numpy()
+        if engine is not model:
+            cases["compiled_predict_proba_single"] = (lambda: engine.predict_proba(row_array), 1000, 1)
+            cases["compiled_predict_proba_batch"] = (lambda: engine.predict_proba(batch), 10, rows)
+
+        if wanted("explain_single", "explain_batch"):
+            from explain import get_explainer, top_factors
+
+            explainer = get_explainer(engine)
+            if explainer is not None:
+                cases["explain_single"] = (lambda: top_factors(engine, schema, row_array), 1000, 1)
+                cases["explain_batch"] = (lambda: explainer.contributions(batch), 10, rows)
+
+    if wanted("pdf_render", "pdf_render_unicode"):
+        from report import build_report
+
+        unicode_patient = dict(DEFAULT_PATIENT, full_name="Zoë Ñandú Ивановa")
+        cases["pdf_render"] = (lambda: build_report(DEFAULT_PATIENT, 1, [0.3, 0.7]), 50, 1)
+        cases["pdf_render_unicode"] = (lambda: build_report(unicode_patient, 1, [0.3, 0.7]), 10, 1)
+
+    from screening import bmi_category, diabetes_risk
+
+    if wanted("screening_single"):
+        cases["screening_single"] = (lambda: (int(diabetes_risk(112, 168, 6.1)), int(bmi_category(28.4))), 2000, 1)
+    if wanted("screening_batch"):
+        readings = [cohort[c].to_numpy(dtype=np.float64) for c in ("fasting_blood_sugar", "post_meal_blood_sugar", "hba1c")]
+        bmis = cohort["bmi"].to_numpy(dtype=np.float64)
+        cases["screening_batch"] = (lambda: (diabetes_risk(*readings), bmi_category(bmis)), 50, rows)
+
+    if wanted("chatbot_response"):
+        from chatbot import chatbot_response
+
+        state = {}
+        cases["chatbot_response"] = (lambda: [chatbot_response(m, state) for m in CHAT_MESSAGES], 2000,
+                                     len(CHAT_MESSAGES))
+
+    if wanted("chat_history_rerun"):
+        from chat_history import ChatHistory
+
+        # A long conversation: one rerun renders the recent window and the newest older page
+        history = ChatHistory()
+        for i in range(10000):
+            history.append("user" if i % 2 else "bot", CHAT_MESSAGES[i % len(CHAT_MESSAGES)])
+        cases["chat_history_rerun"] = (
+            lambda: (history.window_markdown(), history.page_markdown(history.page_count() - 1)), 2000, 1)
+    return {name: case for name, case in cases.items() if wanted(name)}, errors
+
+
+def run(model_path="healthcare_model.pkl", rows=10000, only=None, log=sys.stderr):
+    import sklearn
+
+    cases, errors = build_cases(model_path, rows, only)
+    results = {}
+    for name, (fn, repeat, items) in cases.items():
+        try:
+            results[name] = measure(fn, repeat, items=items)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+            continue
+        r = results[name]
+        print(f"{name:<32} p50 {r['p50_ms']:>9.3f} ms  p99 {r['p99_ms']:>9.3f} ms  "
+              f"{r['throughput_per_s']:>12.0f}/s  peak {r['peak_memory_bytes'] / 2**20:>7.2f} MiB", file=log)
+    for name, error in errors.items():
+        print(f"{name:<32} skipped: {error}", file=log)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "model": os.path.abspath(model_path),
+            "rows": rows,
+        },
+        "results": results,
+        "errors": errors,
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """Cases whose p50 latency grew by more than `threshold` (a fraction) over the baseline."""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before["p50_ms"]:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1.0
+        if change > threshold:
+            regressions.append({"case": name, "baseline_p50_ms": before["p50_ms"],
+                                "p50_ms": result["p50_ms"], "change": change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's hot paths outside Streamlit.")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows in the synthetic batch cohort")
+    parser.add_argument("--only", help="Comma-separated case names to run")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to save the results")
+    parser.add_argument("--baseline", help="Earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.model, args.rows, set(args.only.split(",")) if args.only else None)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}: p50 {r['baseline_p50_ms']:.3f} -> {r['p50_ms']:.3f} ms "
+                  f"(+{r['change'] * 100:.0f}%)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
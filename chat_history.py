@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_CAPACITY = 200
+DEFAULT_WINDOW = 10
+DEFAULT_PAGE_SIZE = 20
+
+ROLE_LABELS = {"user": "👤 You", "bot": "🤖 Bot"}
+
+
+def render_message(role, content):
+    """One chat message as sidebar markdown."""
+    return f"**{ROLE_LABELS.get(role, role)}:** {content}"
+
+
+def _render(messages):
+    return "\n\n".join(render_message(role, content) for _, role, content in messages)
+
+
+class ChatHistory:
+    """One app session's chat messages, held in a fixed-size ring buffer.
+
+    Messages are numbered from 0 (`seq`) in the order they were added. The
+    newest `window` messages are what a rerun shows; their markdown is built
+    once per change and reused, so a rerun costs one markdown element no
+    matter how long the conversation is. Older messages are paginated in
+    `page_size` pages counted from the start of the conversation. A full
+    page never changes, so the markdown of the last `cached_pages` pages
+    opened is kept as well.
+
+    Once `capacity` messages are held, each new one pushes the oldest out.
+    Without a `store` the evicted messages are gone; with one (a
+    `patient_store.PatientStore`) they are written under `session` a page at
+    a time on the store's writer thread and read back when their page is
+    opened.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, window=DEFAULT_WINDOW, page_size=DEFAULT_PAGE_SIZE,
+                 store=None, session=None, cached_pages=8):
+        if not 0 < window <= capacity:
+            raise ValueError(f"window must be between 1 and capacity ({capacity}), got {window}")
+        if store is not None and session is None:
+            raise ValueError("A session id is required to spill chat history to a store")
+        self.capacity = capacity
+        self.window = window
+        self.page_size = page_size
+        self.store = store
+        self.session = session
+        self.cached_pages = cached_pages
+        self.total = 0
+        self._messages = deque(maxlen=capacity)  # (seq, role, content)
+        self._spill = []  # evicted, not yet handed to the store
+        self._pending = None
+        self._window_markdown = None
+        self._pages = OrderedDict()
+
+    def __len__(self):
+        return self.total
+
+    def append(self, role, content):
+        """Add a message and return its seq."""
+        if len(self._messages) == self.capacity:
+            evicted = self._messages[0]
+            if self.store is not None:
+                self._spill.append(evicted)
+                if len(self._spill) >= self.page_size:
+                    self.flush()
+        seq = self.total
+        self._messages.append((seq, role, content))
+        self.total += 1
+        self._window_markdown = None
+        return seq
+
+    def flush(self):
+        """Hand evicted messages to the store; returns the write's Future, or None if nothing was pending."""
+        if self._spill:
+            self._pending = self.store.save_chat(self.session, self._spill)
+            self._spill = []
+        return self._pending
+
+    @property
+    def first(self):
+        """Seq of the oldest message that can still be shown."""
+        if self.store is not None:
+            return 0
+        return self._messages[0][0] if self._messages else 0
+
+    def recent(self):
+        """The newest `window` messages as (seq, role, content), oldest first."""
+        start = max(len(self._messages) - self.window, 0)
+        return [self._messages[i] for i in range(start, len(self._messages))]
+
+    def window_markdown(self):
+        if self._window_markdown is None:
+            self._window_markdown = _render(self.recent())
+        return self._window_markdown
+
+    # --- older history ---
+
+    @property
+    def older_count(self):
+        """Messages before the recent window that can still be shown."""
+        return max(self.total - self.window - self.first, 0)
+
+    def _page_bounds(self):
+        first_page = self.first // self.page_size
+        older_end = self.total - self.window
+        if older_end <= self.first:
+            return first_page, first_page, self.first
+        return first_page, -(-older_end // self.page_size), older_end
+
+    def page_count(self):
+        first_page, end_page, _ = self._page_bounds()
+        return end_page - first_page
+
+    def page(self, number):
+        """Messages on older-history page `number` (0 = oldest shown) as (seq, role, content)."""
+        first_page, end_page, older_end = self._page_bounds()
+        if not 0 <= number < end_page - first_page:
+            raise IndexError(f"Chat history page {number} out of range ({end_page - first_page} pages)")
+        page = first_page + number
+        return self._range(max(page * self.page_size, self.first), min((page + 1) * self.page_size, older_end))
+
+    def page_markdown(self, number):
+        first_page, _, older_end = self._page_bounds()
+        page = first_page + number
+        markdown = self._pages.get(page)
+        if markdown is not None:
+            self._pages.move_to_end(page)
+            return markdown
+        markdown = _render(self.page(number))
+        # Only pages that are complete and fully retained are immutable
+        if page * self.page_size >= self.first and (page + 1) * self.page_size <= older_end:
+            self._pages[page] = markdown
+            if len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+        return markdown
+
+    def _range(self, start, end):
+        # Sources in seq order: the store, evicted messages not yet handed over, then the buffer
+        messages = []
+        held = self._messages[0][0] if self._messages else self.total
+        spilled = self._spill[0][0] if self._spill else held
+        if start < spilled:
+            if self._pending is not None:
+                self._pending.result()  # make earlier spills visible to this read
+            messages += self.store.chat_messages(self.session, start, min(end, spilled))
+        messages += [m for m in self._spill if start <= m[0] < end]
+        if end > held:
+            messages += [self._messages[seq - held] for seq in range(max(start, held), end)]
+        return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure chat history rerun cost as the conversation grows.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="Conversation lengths to measure")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="Messages held in memory")
+    parser.add_argument("--db", help="Spill evicted messages to this patient store (SQLite file)")
+    parser.add_argument("--repeat", type=int, default=1000, help="Reruns timed per length")
+    args = parser.parse_args(argv)
+
+    store = None
+    if args.db:
+        from patient_store import PatientStore
+
+        store = PatientStore(args.db)
+    for n in args.messages:
+        history = ChatHistory(args.capacity, store=store, session=f"benchmark-{os.getpid()}-{n}")
+        unbounded = []
+        start = time.perf_counter()
+        for i in range(n):
+            role = "user" if i % 2 else "bot"
+            history.append(role, f"message {i}")
+            unbounded.append((i, role, f"message {i}"))
+        fill = time.perf_counter() - start
+        history.flush()
+
+        # A rerun shows the recent window and the newest older page
+        def rerun():
+            history.window_markdown()
+            if history.page_count():
+                history.page_markdown(history.page_count() - 1)
+
+        rerun()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            rerun()
+        bounded = (time.perf_counter() - start) / args.repeat
+        start = time.perf_counter()
+        for _ in range(max(args.repeat // 100, 1)):
+            _render(unbounded)
+        full = (time.perf_counter() - start) / max(args.repeat // 100, 1)
+        print(f"{n} messages: append {fill / n * 1e6:.2f} us/message; rerun {bounded * 1e6:.2f} us "
+              f"({history.page_count()} older pages) vs rendering everything {full * 1e6:.0f} us")
+    if store is not None:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
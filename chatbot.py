@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from functools import lru_cache
+
+from metrics import span
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot_intents.json")
+
+
+class PatternAutomaton:
+    """Aho-Corasick automaton over a fixed set of patterns.
+
+    `search` reports every pattern that occurs anywhere in a text (substring
+    semantics, like `pattern in text`) in a single pass over the text, so its
+    cost does not depend on how many patterns the automaton holds.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        goto = [{}]
+        outputs = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pattern_id)
+
+        # Breadth-first failure links; each state inherits its fallback's outputs
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(o) for o in outputs]
+
+    def search(self, text):
+        """Set of pattern ids occurring in `text`."""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class IntentMatcher:
+    """Ranks chatbot intents for a message using a data-driven catalog.
+
+    The catalog (see chatbot_intents.json) lists greetings, a default reply
+    and intents, each with patterns and a response. A pattern is a string or
+    `{"text": ..., "weight": ...}`. Every intent with a pattern found in the
+    message matches, and matches rank in catalog order: the intent listed
+    first wins, as it did in the keyword if-chain this replaces, so the order
+    of the catalog is the priority order. An intent's score is the summed
+    weight of its distinct patterns found; it is reported alongside the
+    ranking but does not reorder it.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.greetings = frozenset(p.lower() for p in catalog["greetings"]["phrases"])
+        self.greeting_response = catalog["greetings"]["response"]
+        self.default_response = catalog["default_response"]
+        self.intents = catalog["intents"]
+        self._by_name = {intent["name"]: intent for intent in self.intents}
+        patterns, self._pattern_intent, self._pattern_weight = [], [], []
+        for intent_id, intent in enumerate(self.intents):
+            for pattern in intent["patterns"]:
+                if isinstance(pattern, str):
+                    pattern = {"text": pattern}
+                patterns.append(pattern["text"].lower())
+                self._pattern_intent.append(intent_id)
+                self._pattern_weight.append(float(pattern.get("weight", 1.0)))
+        self.automaton = PatternAutomaton(patterns)
+
+    @classmethod
+    def from_file(cls, path=CATALOG_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def rank(self, message):
+        """[(intent name, score)] for every matching intent, in catalog (priority) order."""
+        scores = {}
+        for pattern_id in self.automaton.search(message.lower()):
+            intent_id = self._pattern_intent[pattern_id]
+            scores[intent_id] = scores.get(intent_id, 0.0) + self._pattern_weight[pattern_id]
+        return [(self.intents[intent_id]["name"], scores[intent_id]) for intent_id in sorted(scores)]
+
+    def classify(self, message):
+        """Best intent name for `message`, "greeting", or None when nothing matches."""
+        message = message.lower().strip()
+        if message in self.greetings:
+            return "greeting"
+        ranked = self.rank(message)
+        return ranked[0][0] if ranked else None
+
+    def classify_many(self, messages):
+        return [self.classify(message) for message in messages]
+
+    def respond(self, message, state):
+        message = message.lower().strip()
+        if message in self.greetings:
+            return self.greeting_response
+        ranked = self.rank(message)
+        if not ranked:
+            return self.default_response
+        intent = self._by_name[ranked[0][0]]
+        state["last_topic"] = intent.get("topic", intent["name"])
+        return intent["response"]
+
+
+@lru_cache(maxsize=None)
+def default_matcher():
+    """The matcher for the bundled catalog, built once per process."""
+    return IntentMatcher.from_file()
+
+
+# --- Smarter Chatbot Response System ---
+# `state` is any mutable mapping (st.session_state in the app); the last matched
+# topic is kept under "last_topic" for follow-up questions.
+@span("chatbot")
+def chatbot_response(user_message, state):
+    return default_matcher().respond(user_message, state)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify logged chatbot messages by intent.")
+    parser.add_argument("messages", help="Text file with one message per line")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Intent catalog (JSON)")
+    args = parser.parse_args(argv)
+
+    matcher = IntentMatcher.from_file(args.catalog)
+    counts = {}
+    with open(args.messages, encoding="utf-8") as f:
+        for line in f:
+            message = line.rstrip("\n")
+            intent = matcher.classify(message) or "unmatched"
+            counts[intent] = counts.get(intent, 0) + 1
+            print(f"{intent}\t{message}")
+    for intent, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"{intent}: {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
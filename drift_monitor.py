@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+PROFILE_VERSION = 1
+DEFAULT_BINS = 10
+
+# Population stability index bands (the usual credit-scoring rule of thumb)
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+_EPSILON = 1e-4  # floor for empty bins so PSI stays finite
+
+DRIFT_PSI = metrics.REGISTRY.gauge("healthcare_drift_psi", "PSI of live inputs against the training profile.",
+                                   ("profile", "feature"))
+DRIFT_KS = metrics.REGISTRY.gauge("healthcare_drift_ks", "Binned KS distance of live inputs against the "
+                                  "training profile.", ("profile", "feature"))
+DRIFT_ROWS = metrics.REGISTRY.gauge("healthcare_drift_rows", "Scored rows observed by the drift monitor.",
+                                    ("profile",))
+
+
+def profile_path(model_path):
+    """Where the reference profile for `model_path` is stored (next to the model)."""
+    return os.path.splitext(model_path)[0] + ".profile.json"
+
+
+class DriftProfile:
+    """Reference distribution of every model column, captured at training time.
+
+    Numeric columns are binned at the training data's quantiles, so each
+    bin holds about the same share of training rows; indicator and code
+    columns count each value seen in training. Every column also has a slot
+    for missing values (NaN), and categorical columns one for unseen values.
+    A live sketch is just a count per slot, so its size is fixed by the
+    profile no matter how many rows are observed.
+    """
+
+    def __init__(self, features, rows=None):
+        self.features = [dict(f) for f in features]
+        self.rows = rows
+        self.columns = [f["column"] for f in self.features]
+        self.slots = np.array([len(f["reference"]) for f in self.features], dtype=np.intp)
+        self.offsets = np.concatenate([[0], np.cumsum(self.slots)[:-1]]).astype(np.intp)
+        self.reference = np.concatenate([np.asarray(f["reference"], dtype=np.float64) for f in self.features])
+        self._edges = [np.asarray(f.get("edges", ()), dtype=np.float64) for f in self.features]
+        self._values = [np.asarray(f.get("values", ()), dtype=np.float64) for f in self.features]
+
+    @classmethod
+    def fit(cls, X, schema, bins=DEFAULT_BINS, sample_rows=200000, random_state=42):
+        """Profile the encoded training matrix `X` (columns in `schema` order).
+
+        Bin edges come from at most `sample_rows` rows; the reference counts
+        from all of them, read a block at a time so a memory-mapped training
+        cache is never loaded whole.
+        """
+        X = np.asarray(X) if not hasattr(X, "to_numpy") else X.to_numpy(dtype=np.float64)
+        rng = np.random.default_rng(random_state)
+        sample = X if len(X) <= sample_rows else X[np.sort(rng.choice(len(X), sample_rows, replace=False))]
+        sample = np.asarray(sample, dtype=np.float64)
+        features = []
+        for i, f in enumerate(schema.features):
+            values = sample[:, i]
+            present = values[~np.isnan(values)]
+            if f["kind"] == "numeric":
+                quantiles = np.quantile(present, np.arange(1, bins) / bins) if len(present) else []
+                edges = np.unique(quantiles).tolist()
+                features.append({"column": f["column"], "kind": "numeric", "edges": edges,
+                                 "reference": [0] * (len(edges) + 2)})
+            else:
+                codes = np.unique(present).tolist()
+                features.append({"column": f["column"], "kind": "categorical", "values": codes,
+                                 "reference": [0] * (len(codes) + 2)})
+        profile = cls(features)
+        counts = np.zeros(len(profile.reference), dtype=np.int64)
+        for start in range(0, len(X), 65536):
+            counts += profile.count(np.asarray(X[start:start + 65536], dtype=np.float64))
+        profile.reference = counts.astype(np.float64)
+        for f, offset, n in zip(profile.features, profile.offsets, profile.slots):
+            f["reference"] = counts[offset:offset + n].tolist()
+        profile.rows = len(X)
+        return profile
+
+    def count(self, X):
+        """Slot counts of the rows of `X` (a flat int64 array over all columns)."""
+        X = np.asarray(X, dtype=np.float64)
+        index = np.empty(X.shape, dtype=np.intp)
+        for i, (edges, values) in enumerate(zip(self._edges, self._values)):
+            column = X[:, i]
+            if self.features[i]["kind"] == "numeric":
+                slot = np.searchsorted(edges, column, side="right")
+                missing = len(edges) + 1
+            else:
+                slot = np.searchsorted(values, column)
+                known = slot < len(values)
+                known[known] = values[slot[known]] == column[known]
+                slot[~known] = len(values)  # unseen value
+                missing = len(values) + 1
+            slot[np.isnan(column)] = missing
+            index[:, i] = slot + self.offsets[i]
+        return np.bincount(index.ravel(), minlength=len(self.reference))
+
+    def scores(self, counts):
+        """Per-column PSI and binned KS distance of live `counts` against the reference."""
+        result = {}
+        for f, offset, n in zip(self.features, self.offsets, self.slots):
+            live = counts[offset:offset + n].astype(np.float64)
+            reference = self.reference[offset:offset + n]
+            if not live.sum() or not reference.sum():
+                result[f["column"]] = {"psi": None, "ks": None, "rows": int(live.sum())}
+                continue
+            p_live = np.maximum(live / live.sum(), _EPSILON)
+            p_reference = np.maximum(reference / reference.sum(), _EPSILON)
+            psi = float(((p_live - p_reference) * np.log(p_live / p_reference)).sum())
+            ks = None
+            if f["kind"] == "numeric":
+                # Bins are ordered for numeric columns only; the missing slot is left out
+                ks = float(np.abs(np.cumsum(live[:-1]) / live.sum()
+                                  - np.cumsum(reference[:-1]) / reference.sum()).max())
+            result[f["column"]] = {"psi": psi, "ks": ks, "rows": int(live.sum())}
+        return result
+
+    def to_dict(self):
+        return {"version": PROFILE_VERSION, "rows": self.rows, "features": self.features}
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != PROFILE_VERSION:
+            raise ValueError(f"Unsupported drift profile version in {path}: {data.get('version')}")
+        return cls(data["features"], data.get("rows"))
+
+
+def status(psi):
+    if psi is None:
+        return "no data"
+    if psi >= PSI_SIGNIFICANT:
+        return "significant"
+    if psi >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+class DriftMonitor:
+    """Live slot counts of scored rows, compared against a `DriftProfile`.
+
+    `observe` copies small batches (e.g. the app's single rows) into a
+    fixed buffer and bins them `buffer_rows` at a time, so the per-row cost
+    on the request path is one array copy. Large batches are binned
+    directly. Memory is the buffer plus one count per profile slot. Safe to
+    share across threads. Scores are only computed on demand (`report`, or
+    a metrics scrape for monitors created with `publish`).
+    """
+
+    def __init__(self, profile, buffer_rows=256, publish=True):
+        self.profile = profile
+        self.counts = np.zeros(len(profile.reference), dtype=np.int64)
+        self.rows = 0
+        self.started = time.time()
+        self.publish = publish
+        self._buffer = np.empty((buffer_rows, len(profile.columns)), dtype=np.float64)
+        self._fill = 0
+        self._lock = threading.Lock()
+
+    def observe(self, X):
+        X = X.to_numpy(dtype=np.float64) if hasattr(X, "to_numpy") else np.asarray(X, dtype=np.float64)
+        X = X.reshape(-1, len(self.profile.columns))
+        if len(X) >= len(self._buffer):
+            self.merge(self.profile.count(X), len(X))
+            return
+        with self._lock:
+            if self._fill + len(X) > len(self._buffer):
+                self._flush_locked()
+            self._buffer[self._fill:self._fill + len(X)] = X
+            self._fill += len(X)
+            if self._fill == len(self._buffer):
+                self._flush_locked()
+
+    def merge(self, counts, rows):
+        """Add slot counts computed elsewhere (e.g. by a scoring worker process)."""
+        with self._lock:
+            self.counts += counts
+            self.rows += rows
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._fill:
+            self.counts += self.profile.count(self._buffer[:self._fill])
+            self.rows += self._fill
+            self._fill = 0
+
+    def take(self):
+        """Return (counts, rows) observed since the last call and start over."""
+        with self._lock:
+            self._flush_locked()
+            counts, rows = self.counts, self.rows
+            self.counts = np.zeros_like(counts)
+            self.rows = 0
+            return counts, rows
+
+    def report(self):
+        """Per-column PSI/KS and status, worst first, plus the overall status."""
+        self.flush()
+        with self._lock:
+            counts, rows = self.counts.copy(), self.rows
+        scores = self.profile.scores(counts)
+        columns = sorted(scores.items(), key=lambda item: -(item[1]["psi"] or 0.0))
+        worst = columns[0][1]["psi"] if columns else None
+        return {
+            "rows": rows,
+            "since": self.started,
+            "status": status(worst),
+            "max_psi": worst,
+            "features": {column: dict(s, status=status(s["psi"])) for column, s in columns},
+        }
+
+    def save(self, path):
+        """Write the live counts, so a later process (or `drift_monitor.py report`) can resume them."""
+        self.flush()
+        with self._lock:
+            data = {"version": PROFILE_VERSION, "rows": self.rows, "since": self.started,
+                    "columns": self.profile.columns, "counts": self.counts.tolist()}
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("columns") != self.profile.columns:
+            raise ValueError(f"{path} was recorded against a different profile")
+        self.merge(np.asarray(data["counts"], dtype=np.int64), data["rows"])
+        self.started = data["since"]
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(model_path, **kwargs):
+    """The process-wide monitor for `model_path`, or None when it has no reference profile.
+
+    A new profile (a retrained model was published) starts a fresh monitor;
+    checking costs a `stat`.
+    """
+    path = os.path.abspath(profile_path(model_path))
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _monitors_lock:
+        cached = _monitors.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _monitors[path] = (mtime, DriftMonitor(DriftProfile.load(path), **kwargs))
+        return cached[1]
+
+
+def _publish():
+    # Metrics collector: refresh the drift gauges of every publishing monitor at scrape time
+    with _monitors_lock:
+        monitors = [(path, monitor) for path, (_, monitor) in _monitors.items() if monitor.publish]
+    for path, monitor in monitors:
+        name = os.path.basename(path)
+        report = monitor.report()
+        for column, s in report["features"].items():
+            if s["psi"] is not None:
+                DRIFT_PSI.set(s["psi"], name, column)
+            if s["ks"] is not None:
+                DRIFT_KS.set(s["ks"], name, column)
+        DRIFT_ROWS.set(report["rows"], name)
+
+
+metrics.REGISTRY.add_collector(_publish)
+
+
+def print_report(report, file=sys.stdout):
+    print(f"Rows observed: {report['rows']}  overall: {report['status']} (max PSI "
+          f"{report['max_psi'] if report['max_psi'] is None else format(report['max_psi'], '.3f')})", file=file)
+    print(f"{'feature':<32}{'psi':>8}{'ks':>8}  status", file=file)
+    for column, s in report["features"].items():
+        psi = "n/a" if s["psi"] is None else f"{s['psi']:.3f}"
+        ks = "" if s["ks"] is None else f"{s['ks']:.3f}"
+        print(f"{column:<32}{psi:>8}{ks:>8}  {s['status']}", file=file)
+
+
+def main(argv=None):
+    from features import load_schema
+    from model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Build a drift reference profile or check live inputs against it.")
+    parser.add_argument("command", choices=["profile", "check", "report"],
+                        help="profile: build the reference from training data; check: compare a data file; "
+                             "report: print saved live counts")
+    parser.add_argument("path", help="Training/live CSV or Parquet (profile, check) or saved live counts (report)")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS, help="Quantile bins per numeric column (profile)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--output", help="Where to write the JSON report (check, report)")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    schema = load_schema(args.model, model)
+    if args.command == "profile":
+        from scoring import iter_chunks
+
+        X = np.concatenate([schema.encode_array(chunk) for chunk in iter_chunks(args.path, args.chunk_size)])
+        profile = DriftProfile.fit(X, schema, args.bins)
+        profile.save(profile_path(args.model))
+        print(f"Wrote {profile_path(args.model)} ({len(X)} rows, {len(profile.reference)} slots)")
+        return 0
+
+    monitor = DriftMonitor(DriftProfile.load(profile_path(args.model)), publish=False)
+    if args.command == "check":
+        from scoring import iter_chunks
+
+        for chunk in iter_chunks(args.path, args.chunk_size):
+            monitor.observe(schema.encode_array(chunk))
+    else:
+        monitor.load(args.path)
+    report = monitor.report()
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["status"] == "significant" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import argparse
+import sys
+import time
+import weakref
+
+import numpy as np
+
+from tree_engine import CompiledEnsemble, accelerate
+
+
+def node_levels(engine):
+    """Node indices of every tree, grouped by depth (roots first)."""
+    left, right = engine.left.astype(np.intp), engine.right.astype(np.intp)
+    is_leaf = left == np.arange(len(left))
+    levels = []
+    frontier = engine.roots.astype(np.intp)
+    while len(frontier):
+        levels.append(frontier)
+        internal = frontier[~is_leaf[frontier]]
+        frontier = np.concatenate([left[internal], right[internal]])
+    return levels
+
+
+def node_expectations(engine, levels=None):
+    """Each node's expected output: its own value for leaves, the cover-weighted mean of its leaves otherwise."""
+    if engine.cover is None:
+        raise ValueError("The engine has no node cover; recompile the model or reconvert its artifact")
+    levels = node_levels(engine) if levels is None else levels
+    left, right = engine.left.astype(np.intp), engine.right.astype(np.intp)
+    is_leaf = left == np.arange(len(left))
+    expected = np.array(engine.value, dtype=np.float64)
+    cover = np.asarray(engine.cover, dtype=np.float64)
+    for nodes in reversed(levels):
+        internal = nodes[~is_leaf[nodes]]
+        l, r = left[internal], right[internal]
+        expected[internal] = (cover[l] * expected[l] + cover[r] * expected[r]) / (cover[l] + cover[r])
+    return expected
+
+
+class PathExplainer:
+    """Per-feature contributions to a compiled ensemble's raw score (Saabas path attributions).
+
+    Every node's expected value is the cover-weighted mean of the leaves
+    below it. Following a split from a node to its child moves the tree's
+    output by `expected[child] - expected[node]`, which is credited to the
+    split feature, so for each row
+
+        bias + contributions.sum(axis=-1) == decision_function(row)
+
+    i.e. the contributions are in log-odds for the log-loss model. Paths
+    depend only on the leaf reached, so each leaf's (feature, delta) path is
+    tabulated once here; explaining a batch is the engine's usual leaf walk
+    plus one gather and a `bincount`.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        n_nodes = len(engine.feature)
+        n_features = len(engine.feature_names_in_) if engine.feature_names_in_ is not None \
+            else int(engine.feature.max()) + 1
+        left, right = engine.left.astype(np.intp), engine.right.astype(np.intp)
+        is_leaf = left == np.arange(n_nodes)
+
+        levels = node_levels(engine)
+        expected = node_expectations(engine, levels)
+
+        # Top-down: each node inherits its parent's path plus the split that leads to it.
+        # Slots fold the tree's class in, so multi-class models share one bincount
+        tree_of_node = np.searchsorted(engine.roots, np.arange(n_nodes), side="right") - 1
+        node_slot = engine.tree_class.astype(np.intp)[tree_of_node] * n_features + engine.feature
+        depth = max(len(levels) - 1, 1)
+        path_slot = np.zeros((n_nodes, depth), dtype=np.intp)
+        path_delta = np.zeros((n_nodes, depth), dtype=np.float64)
+        for d, nodes in enumerate(levels[:-1]):
+            internal = nodes[~is_leaf[nodes]]
+            for child in (left[internal], right[internal]):
+                path_slot[child, :d] = path_slot[internal, :d]
+                path_delta[child, :d] = path_delta[internal, :d]
+                path_slot[child, d] = node_slot[internal]
+                path_delta[child, d] = expected[child] - expected[internal]
+
+        leaves = np.flatnonzero(is_leaf)
+        self._leaf_row = np.full(n_nodes, -1, dtype=np.intp)
+        self._leaf_row[leaves] = np.arange(len(leaves))
+        self.path_slot = path_slot[leaves]
+        self.path_delta = path_delta[leaves]
+        self.n_features = n_features
+        self.bias = engine.baseline + np.bincount(engine.tree_class, weights=expected[engine.roots],
+                                                  minlength=engine.n_raw)
+
+    @property
+    def nbytes(self):
+        return self._leaf_row.nbytes + self.path_slot.nbytes + self.path_delta.nbytes
+
+    def contributions(self, X, block_size=256):
+        """(n_rows, n_features) contributions, or (n_rows, n_classes, n_features) for multi-class."""
+        engine = self.engine
+        X = engine._as_array(X)
+        width = engine.n_raw * self.n_features
+        out = np.empty((len(X), width), dtype=np.float64)
+        for start in range(0, len(X), block_size):
+            block = X[start:start + block_size]
+            rows = self._leaf_row.take(engine.leaves(block))
+            slots = self.path_slot.take(rows, axis=0) + (np.arange(len(block)) * width)[:, None, None]
+            out[start:start + len(block)] = np.bincount(
+                slots.ravel(), weights=self.path_delta.take(rows, axis=0).ravel(), minlength=len(block) * width
+            ).reshape(len(block), width)
+        out = out.reshape(len(X), engine.n_raw, self.n_features)
+        return out[:, 0] if engine.n_raw == 1 else out
+
+
+_explainers = weakref.WeakKeyDictionary()
+
+
+def get_explainer(model):
+    """The explainer for `model` (built once per compiled engine), or None if it cannot be explained."""
+    engine = accelerate(model)
+    if not isinstance(engine, CompiledEnsemble):
+        return None
+    explainer = _explainers.get(engine)
+    if explainer is None:
+        try:
+            explainer = _explainers[engine] = PathExplainer(engine)
+        except ValueError:
+            return None
+    return explainer
+
+
+def by_source(contributions, schema):
+    """Sum the contributions of columns that come from the same raw field (e.g. one-hot indicators).
+
+    Returns (sources, values) with sources in schema order.
+    """
+    sources = list(dict.fromkeys(f["source"] for f in schema.features))
+    index = {source: i for i, source in enumerate(sources)}
+    groups = np.zeros((len(schema.columns), len(sources)))
+    groups[np.arange(len(schema.columns)), [index[f["source"]] for f in schema.features]] = 1.0
+    return sources, contributions @ groups
+
+
+def top_contributors(values, names, k=5, decimals=3):
+    """The `k` largest contributions by magnitude as ((name, value), ...).
+
+    Contributions that round to zero at `decimals` places (the precision they
+    are displayed at) are skipped.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-np.abs(values), kind="stable")[:k]
+    return tuple((names[i], float(values[i])) for i in order if round(float(values[i]), decimals) != 0)
+
+
+def top_factors(model, schema, features, k=5, decimals=2):
+    """Top raw-field contributors for a single encoded row, or None if the model cannot be explained.
+
+    Contributions are toward the last class (the "high risk" class of the
+    app's binary model). `decimals` is the display precision (the app and
+    reports show two places).
+    """
+    explainer = get_explainer(model)
+    if explainer is None:
+        return None
+    contributions = explainer.contributions(features)
+    if contributions.ndim == 3:
+        contributions = contributions[:, -1]
+    sources, values = by_source(contributions, schema)
+    return top_contributors(values[0], sources, k, decimals)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from features import load_schema
+    from model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Explain model predictions as per-field log-odds contributions.")
+    parser.add_argument("records", help="CSV with raw patient records")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--top", type=int, default=5, help="Contributors to print per row")
+    parser.add_argument("--rows", type=int, default=5, help="Rows to print")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    schema = load_schema(args.model, model)
+    start = time.perf_counter()
+    explainer = get_explainer(model)
+    if explainer is None:
+        print(f"{type(model).__name__} cannot be explained (needs a compiled GradientBoostingClassifier)",
+              file=sys.stderr)
+        return 1
+    print(f"Path tables built in {(time.perf_counter() - start) * 1000:.1f} ms ({explainer.nbytes} bytes)")
+
+    X = schema.encode_array(pd.read_csv(args.records))
+    start = time.perf_counter()
+    contributions = explainer.contributions(X)
+    elapsed = time.perf_counter() - start
+    raw = explainer.engine.decision_function(X)
+    error = np.abs(explainer.bias + contributions.sum(axis=-1) - raw).max()
+    print(f"Explained {len(X)} rows in {elapsed * 1000:.1f} ms; max |bias + sum - raw score| = {error:.2e}")
+
+    if contributions.ndim == 3:
+        contributions = contributions[:, -1]
+    sources, values = by_source(contributions, schema)
+    for i in range(min(args.rows, len(X))):
+        factors = ", ".join(f"{name} {value:+.3f}" for name, value in top_contributors(values[i], sources, args.top))
+        print(f"row {i}: {factors}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from metrics import span
+
+SCHEMA_VERSION = 1
+
+# Model columns and how each one is derived from a patient record:
+# (column, source field, value). A value of None means the source field is
+# used as a number; otherwise the column is 1 when the field equals the value.
+FEATURE_SPEC = [
+    ("age", "age", None),
+    ("gender", "gender", "Female"),
+    ("blood_pressure", "blood_pressure", None),
+    ("cholesterol", "cholesterol", None),
+    ("bmi", "bmi", None),
+    ("glucose", "glucose", None),
+    ("smoking_status", "smoking_status", "Smoker"),
+    ("alcohol_consumption_light", "alcohol_consumption", "Light"),
+    ("alcohol_consumption_moderate", "alcohol_consumption", "Moderate"),
+    ("alcohol_consumption_heavy", "alcohol_consumption", "Heavy"),
+    ("physical_activity_light", "physical_activity", "Light"),
+    ("physical_activity_moderate", "physical_activity", "Moderate"),
+    ("physical_activity_heavy", "physical_activity", "Heavy"),
+    ("family_history", "family_history", "Yes"),
+    ("diet_unbalanced", "diet", "Unbalanced"),
+    ("diet_vegetarian", "diet", "Vegetarian"),
+    ("diet_vegan", "diet", "Vegan"),
+    ("sleep_hours", "sleep_hours", None),
+    ("stress_level_moderate", "stress_level", "Moderate"),
+    ("stress_level_high", "stress_level", "High"),
+    ("heart_rate", "heart_rate", None),
+    ("oxygen_saturation", "oxygen_saturation", None),
+    ("waist_circumference", "waist_circumference", None),
+    ("hip_circumference", "hip_circumference", None),
+    ("fasting_blood_sugar", "fasting_blood_sugar", None),
+    ("post_meal_blood_sugar", "post_meal_blood_sugar", None),
+    ("hba1c", "hba1c", None),
+]
+
+FEATURE_COLUMNS = [column for column, _, _ in FEATURE_SPEC]
+
+
+class FeatureSchema:
+    """How raw records map onto model columns, shared by training and serving.
+
+    Each feature is a dict with a `column`, the `source` field it reads and a
+    `kind`:
+
+    - "numeric": the source value as a number
+    - "indicator": 1 when the source equals `value`, else 0 (one-hot)
+    - "code": the index of the source value in `categories` (-1 if unseen),
+      the same codes `LabelEncoder` assigns
+
+    The column-index map and per-source lookup tables are built once, so
+    encoding a single record only writes into a preallocated array.
+    """
+
+    def __init__(self, features):
+        self.features = [dict(f) for f in features]
+        self.columns = [f["column"] for f in self.features]
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self._numeric = []
+        self._indicators = {}
+        self._codes = []
+        for i, f in enumerate(self.features):
+            if f["kind"] == "numeric":
+                self._numeric.append((i, f["source"]))
+            elif f["kind"] == "indicator":
+                self._indicators.setdefault(f["source"], {})[f["value"]] = i
+            elif f["kind"] == "code":
+                self._codes.append((i, f["source"], {c: n for n, c in enumerate(f["categories"])}))
+            else:
+                raise ValueError(f"Unknown feature kind for {f['column']}: {f['kind']}")
+        self._local = threading.local()
+
+    @classmethod
+    def from_spec(cls, spec=FEATURE_SPEC):
+        return cls([
+            {"column": column, "source": source, "kind": "numeric"} if value is None
+            else {"column": column, "source": source, "kind": "indicator", "value": value}
+            for column, source, value in spec
+        ])
+
+    @classmethod
+    def fit(cls, data, categorical_columns, exclude=()):
+        """Build a schema from training data, label-encoding `categorical_columns`."""
+        categories = {column: data[column].dropna().unique().tolist() for column in categorical_columns}
+        return cls.from_categories(data.columns, categories, exclude)
+
+    @classmethod
+    def from_categories(cls, columns, categories, exclude=()):
+        """Build a schema from column names and the values seen for each categorical column."""
+        features = []
+        for column in columns:
+            if column in exclude:
+                continue
+            if column in categories:
+                features.append({"column": column, "source": column, "kind": "code",
+                                 "categories": sorted(categories[column])})
+            else:
+                features.append({"column": column, "source": column, "kind": "numeric"})
+        return cls(features)
+
+    def select(self, columns):
+        """The same schema reordered to `columns`; unknown columns encode as 0."""
+        by_column = {f["column"]: f for f in self.features}
+        return FeatureSchema([
+            by_column.get(column, {"column": column, "source": column, "kind": "numeric"})
+            for column in columns
+        ])
+
+    def encode_into(self, record, out):
+        """Write one record (a mapping of raw fields) into the 1-D array `out`."""
+        out.fill(0.0)
+        get = record.get
+        for i, source in self._numeric:
+            value = get(source)
+            if value is not None:
+                out[i] = value
+        for source, positions in self._indicators.items():
+            i = positions.get(get(source))
+            if i is not None:
+                out[i] = 1.0
+        for i, source, codes in self._codes:
+            out[i] = codes.get(get(source), -1)
+        return out
+
+    def row_buffer(self):
+        """A (1, n_columns) buffer for `encode_one`."""
+        return np.zeros((1, len(self.columns)), dtype=np.float64)
+
+    def encode_one(self, record, out=None):
+        """Encode one record into a reusable (1, n_columns) buffer and return it.
+
+        `out` is a buffer from `row_buffer` that the caller keeps, e.g. in the
+        Streamlit session: the app runs every rerun on a new thread, so a
+        per-thread buffer would be allocated again each time. Without `out`,
+        this thread's buffer is used. Either way the buffer is overwritten by
+        the next call; copy it if it has to outlive the prediction.
+        """
+        if out is None:
+            out = getattr(self._local, "buffer", None)
+            if out is None:
+                out = self._local.buffer = self.row_buffer()
+        elif out.shape != (1, len(self.columns)):
+            raise ValueError(f"Expected a (1, {len(self.columns)}) buffer, got {out.shape}")
+        self.encode_into(record, out[0])
+        return out
+
+    @span("encode_batch")
+    def encode_array(self, records, out=None):
+        """Encode a DataFrame of raw records column by column into a 2-D array."""
+        import pandas as pd
+
+        if out is None:
+            out = np.zeros((len(records), len(self.columns)), dtype=np.float64)
+        else:
+            out.fill(0.0)
+        for i, f in enumerate(self.features):
+            if f["source"] not in records:
+                continue
+            values = records[f["source"]]
+            if f["kind"] == "numeric":
+                out[:, i] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            elif f["kind"] == "indicator":
+                out[:, i] = values.to_numpy() == f["value"]
+            else:
+                out[:, i] = pd.Categorical(values, categories=f["categories"]).codes
+        return out
+
+    def encode_frame(self, records):
+        """Like `encode_array`, returned as a DataFrame with the model's column names."""
+        import pandas as pd
+
+        return pd.DataFrame(self.encode_array(records), columns=self.columns, index=records.index)
+
+    def to_dict(self):
+        return {"version": SCHEMA_VERSION, "features": self.features}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=_json_default)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported feature schema version in {path}: {data.get('version')}")
+        return cls(data["features"])
+
+
+def _json_default(value):
+    # Category values read by pandas arrive as NumPy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+DEFAULT_SCHEMA = FeatureSchema.from_spec()
+
+
+def schema_path(model_path):
+    """Where the feature schema for `model_path` is stored (next to the model)."""
+    return os.path.splitext(model_path)[0] + ".schema.json"
+
+
+def model_columns(model):
+    """Columns the model was fitted on, falling back to the app's feature set."""
+    if getattr(model, "feature_names_in_", None) is not None:
+        return list(model.feature_names_in_)
+    return FEATURE_COLUMNS
+
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def load_schema(model_path, model=None):
+    """The feature schema for a model, ordered to the model's columns.
+
+    Uses the schema stored inside the model artifact or saved next to the
+    model when there is one, and the app's built-in patient schema
+    otherwise. Results are cached per schema file version, so calling this
+    on every rerun costs a `stat`.
+    """
+    embedded = getattr(model, "feature_schema", None)
+    if embedded is not None:
+        return embedded
+    path = schema_path(model_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    key = (os.path.abspath(path), tuple(model_columns(model)))
+    with _schemas_lock:
+        cached = _schemas.get(key)
+        if cached is None or cached[0] != mtime:
+            base = FeatureSchema.load(path) if mtime is not None else DEFAULT_SCHEMA
+            cached = _schemas[key] = (mtime, base.select(key[1]))
+        return cached[1]
+
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.metrics import accuracy_score, roc_auc_score
+
+from training_data import TrainingCache
+from tree_engine import accelerate
+
+DEFAULT_GRID = {
+    "n_estimators": [50, 100, 200],
+    "learning_rate": [0.05, 0.1],
+    "max_depth": [2, 3, 4],
+}
+
+
+# The dtype each estimator converts X to before fitting (sklearn copies any other dtype)
+FIT_DTYPES = {"gbc": np.float32, "hist": np.float64}
+
+
+def make_estimator(kind, params, random_state=42):
+    from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+
+    if kind == "hist":
+        return HistGradientBoostingClassifier(early_stopping=False, random_state=random_state, **params)
+    return GradientBoostingClassifier(random_state=random_state, **params)
+
+
+def result_key(params, fold, context):
+    payload = json.dumps({"params": params, "fold": fold, **context}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+# Per-worker state: the memory-mapped training data and the fold split
+_data = {}
+
+
+def _init_worker(cache_dir, n_folds, random_state):
+    # Every worker maps the same cache files read-only, so the OS shares one
+    # physical copy of the training data between all of them
+    cache = TrainingCache(cache_dir)
+    X, y = cache.X_train, cache.y_train
+    folds = list(StratifiedKFold(n_folds, shuffle=True, random_state=random_state).split(np.zeros(len(y)), y))
+    _data.update(X=X, y=y, folds=folds)
+
+
+def _gather(X, index, dtype, chunk_rows=65536):
+    # X[index] in the estimator's fit dtype, gathered a chunk at a time: the full
+    # fancy-indexed float64 copy is never built, and the estimator fits on the
+    # result without converting (copying) it again
+    out = np.empty((len(index), X.shape[1]), dtype=dtype)
+    for start in range(0, len(index), chunk_rows):
+        out[start:start + chunk_rows] = X[index[start:start + chunk_rows]]
+    return out
+
+
+def _latency(model, X, repeat=50):
+    row = np.asarray(X[:1], dtype=np.float64)
+    model.predict_proba(row)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch_seconds = time.perf_counter() - start
+    return float(np.median(timings)), len(X) / batch_seconds if batch_seconds else float("inf")
+
+
+def evaluate_fold(kind, params, fold, random_state=42):
+    """Fit one (params, fold) pair on the worker's mapped data and score it."""
+    X, y = _data["X"], _data["y"]
+    train_idx, valid_idx = _data["folds"][fold]
+    X_valid = np.asarray(X[valid_idx])
+
+    model = make_estimator(kind, params, random_state)
+    start = time.perf_counter()
+    model.fit(_gather(X, train_idx, FIT_DTYPES.get(kind, np.float32)), y[train_idx])
+    fit_seconds = time.perf_counter() - start
+
+    # Time the same inference path the app uses (compiled engine when supported)
+    served = accelerate(model)
+    proba = served.predict_proba(X_valid)
+    y_valid = y[valid_idx]
+    if proba.shape[1] == 2:
+        auc = roc_auc_score(y_valid, proba[:, 1])
+    else:
+        auc = roc_auc_score(y_valid, proba, multi_class="ovr", labels=model.classes_)
+    latency, throughput = _latency(served, X_valid)
+    return {
+        "params": params,
+        "fold": fold,
+        "accuracy": float(accuracy_score(y_valid, model.classes_[proba.argmax(axis=1)])),
+        "auc": float(auc),
+        "fit_seconds": fit_seconds,
+        "latency_seconds": latency,
+        "throughput_rows_per_second": throughput,
+    }
+
+
+def _save_result(path, result):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, path)
+
+
+def run_search(cache, grid=None, kind="gbc", n_folds=5, workers=None, results_dir=".cache/search",
+               random_state=42, log=sys.stderr):
+    """Cross-validate every parameter combination in `grid` on a process pool.
+
+    Each finished (params, fold) result is written to its own file under
+    `results_dir`, keyed on the parameters, fold, estimator and the training
+    cache it was computed on, so an interrupted or extended search only
+    fits what is missing. Returns the leaderboard (see `leaderboard`).
+    """
+    grid = grid or DEFAULT_GRID
+    context = {"data": os.path.basename(cache.directory.rstrip(os.sep)), "kind": kind,
+               "n_folds": n_folds, "random_state": random_state}
+    os.makedirs(results_dir, exist_ok=True)
+
+    results, pending = [], []
+    for params in ParameterGrid(grid):
+        for fold in range(n_folds):
+            path = os.path.join(results_dir, result_key(params, fold, context) + ".json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    results.append(json.load(f))
+            else:
+                pending.append((params, fold, path))
+    print(f"{len(results)} fold results cached, {len(pending)} to fit", file=log)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                 initargs=(cache.directory, n_folds, random_state)) as pool:
+            futures = {pool.submit(evaluate_fold, kind, params, fold, random_state): path
+                       for params, fold, path in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                _save_result(futures[future], result)
+                results.append(result)
+                print(f"[{done}/{len(pending)}] {result['params']} fold {result['fold']}: "
+                      f"accuracy {result['accuracy']:.4f}", file=log)
+
+    return leaderboard(results)
+
+
+def leaderboard(results):
+    """Aggregate fold results per parameter set, best mean accuracy first."""
+    by_params = {}
+    for r in results:
+        by_params.setdefault(json.dumps(r["params"], sort_keys=True), []).append(r)
+    rows = []
+    for key, folds in by_params.items():
+        accuracy = np.array([r["accuracy"] for r in folds])
+        rows.append({
+            "params": json.loads(key),
+            "folds": len(folds),
+            "accuracy_mean": float(accuracy.mean()),
+            "accuracy_std": float(accuracy.std()),
+            "auc_mean": float(np.mean([r["auc"] for r in folds])),
+            "fit_seconds_mean": float(np.mean([r["fit_seconds"] for r in folds])),
+            "latency_us_median": float(np.median([r["latency_seconds"] for r in folds]) * 1e6),
+            "throughput_rows_per_second": float(np.median([r["throughput_rows_per_second"] for r in folds])),
+        })
+    rows.sort(key=lambda r: (-r["accuracy_mean"], r["latency_us_median"]))
+    return rows
+
+
+def print_leaderboard(rows, file=sys.stdout):
+    print(f"{'#':>3}  {'accuracy':>15}  {'AUC':>6}  {'fit s':>7}  {'1-row us':>9}  {'rows/s':>10}  params", file=file)
+    for i, r in enumerate(rows, 1):
+        print(f"{i:>3}  {r['accuracy_mean']:.4f} ± {r['accuracy_std']:.4f}  {r['auc_mean']:.4f}  "
+              f"{r['fit_seconds_mean']:>7.2f}  {r['latency_us_median']:>9.0f}  "
+              f"{r['throughput_rows_per_second']:>10.0f}  {r['params']}", file=file)
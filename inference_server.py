@@ -0,0 +1,408 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+
+import metrics
+from drift_monitor import get_monitor
+from features import FeatureSchema, load_schema
+from model_loader import get_loader
+from scoring import score
+from tree_engine import accelerate
+
+BATCH_ROWS = metrics.REGISTRY.histogram("healthcare_batch_rows", "Rows per micro-batch.",
+                                        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class ModelChanged(Exception):
+    """Raised when a hot reload splits one request's rows across model versions."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests into one `predict_proba` call.
+
+    A batch is flushed once it holds `max_batch_size` rows or `max_wait`
+    seconds after its first row arrived, whichever comes first. Scoring runs
+    on a single worker thread so the event loop keeps accepting requests (and
+    filling the next batch) while a batch is being evaluated.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait=0.002):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Rows encoded on either side of a reload to a different schema can differ in width
+            groups = {}
+            for row, future in batch:
+                groups.setdefault(row.shape, []).append((row, future))
+            for group in groups.values():
+                await self._score_group(loop, group)
+
+    async def _score_group(self, loop, group):
+        # A failure only fails this group's requests; the batcher keeps running
+        try:
+            rows = np.stack([row for row, _ in group])
+            labels, proba, model_info = await loop.run_in_executor(self._executor, self.score_batch, rows)
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(group)
+        BATCH_ROWS.observe(len(group))
+        for i, (_, future) in enumerate(group):
+            if not future.done():
+                future.set_result((labels[i], proba[i], model_info))
+
+
+class InferenceServer:
+    """Local HTTP inference service wrapping the shared model and feature schema.
+
+    Endpoints (JSON):
+
+    - `POST /predict` with `{"records": [patient, ...]}`; each record holds
+      raw fields like `st.session_state["patient_details"]`
+    - `GET /schema` for the model version, classes and feature schema
+    - `GET /health` for batching counters
+    - `GET /metrics` for per-stage latency histograms (Prometheus text format)
+    - `GET /drift` for input drift against the model's training profile
+    """
+
+    def __init__(self, model_path, max_batch_size=64, max_wait=0.002):
+        self.model_path = model_path
+        self.loader = get_loader(model_path)
+        self.batcher = MicroBatcher(self._score_batch, max_batch_size, max_wait)
+        self.requests = 0
+
+    def _model(self):
+        model, version = self.loader.snapshot()
+        model = accelerate(model)
+        return model, load_schema(self.model_path, model), version
+
+    def _score_batch(self, rows):
+        # Each row's result carries the version and classes of the model that scored it
+        model, _, version = self._model()
+        labels, proba = score(model, rows)
+        monitor = get_monitor(self.model_path)
+        if monitor is not None:
+            monitor.observe(rows)
+        return labels, proba, (version, tuple(np.asarray(model.classes_).tolist()))
+
+    async def predict(self, records, attempts=2):
+        """(labels, probabilities, version, classes) for `records`, all scored by one model version.
+
+        Rows of one request can land in micro-batches on either side of a hot
+        reload, or be encoded for one version and scored by the next; such a
+        request is scored again, and rejected with
+        `ModelChanged` if the model keeps changing.
+        """
+        for _ in range(attempts):
+            model, schema, version = self._model()
+            with metrics.span("encode"):
+                rows = [schema.encode_into(record, np.empty(len(schema.columns))) for record in records]
+            results = await asyncio.gather(*(self.batcher.submit(row) for row in rows))
+            infos = {info for _, _, info in results} or {(version, tuple(np.asarray(model.classes_).tolist()))}
+            # Rows must also be scored by the model whose schema encoded them
+            if len(infos) == 1 and next(iter(infos))[0] == version:
+                classes = next(iter(infos))[1]
+                return [label for label, _, _ in results], [proba for _, proba, _ in results], version, classes
+        raise ModelChanged("The model was reloaded while the request was being scored; retry the request")
+
+    async def _dispatch(self, method, path, body):
+        if path == "/predict":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                records = json.loads(body or b"{}")["records"]
+            except (ValueError, KeyError, TypeError):
+                return 400, {"error": "expected a JSON body with a 'records' list"}
+            self.requests += 1
+            try:
+                with metrics.span("http_predict"):
+                    labels, probabilities, version, classes = await self.predict(records)
+            except ModelChanged as e:
+                return 503, {"error": str(e)}
+            return 200, {
+                "model_version": version,
+                "classes": list(classes),
+                "labels": [np.asarray(label).item() for label in labels],
+                "probabilities": [proba.tolist() for proba in probabilities],
+            }
+        if path == "/schema":
+            model, schema, version = self._model()
+            return 200, {
+                "model_version": version,
+                "classes": np.asarray(model.classes_).tolist(),
+                "schema": schema.to_dict(),
+            }
+        if path == "/health":
+            batches = self.batcher.batches
+            _, version = self.loader.snapshot()  # notices a replaced model file, like scoring does
+            return 200, {
+                "status": "ok",
+                "model_version": version,
+                "requests": self.requests,
+                "batches": batches,
+                "rows": self.batcher.rows,
+                "mean_batch_size": self.batcher.rows / batches if batches else 0.0,
+            }
+        if path == "/drift":
+            monitor = get_monitor(self.model_path)
+            if monitor is None:
+                return 404, {"error": "the model has no drift profile"}
+            return 200, monitor.report()
+        if path == "/metrics":
+            return 200, metrics.render()
+        return 404, {"error": f"unknown path {path}"}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: request line, headers, Content-Length body
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin1").split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    length = None
+                    headers["connection"] = "close"  # the body cannot be skipped reliably
+                body = await reader.readexactly(length) if length else b""
+
+                if length is None:
+                    status, payload = 400, {"error": "invalid Content-Length header"}
+                else:
+                    try:
+                        status, payload = await self._dispatch(method, path.split("?", 1)[0], body)
+                    except Exception as e:
+                        status, payload = 500, {"error": str(e)}
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin1") + data
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8500, unix_path=None):
+        self.loader.get()  # load before accepting traffic
+        self.batcher.start()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class InferenceClient:
+    """Blocking client for `InferenceServer`, safe to share across threads.
+
+    `url` is `http://host:port` or `unix:///path/to/socket`. Each thread keeps
+    its own keep-alive connection. The server's feature schema is fetched once
+    and refreshed whenever a response or a `refresh()` probe reports a new
+    model version.
+    """
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+        self._meta_lock = threading.Lock()
+        self.version = None
+        self.classes_ = None
+        self._schema = None
+        self._checked = None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            parsed = urlparse(self.url)
+            if parsed.scheme == "unix":
+                conn = _UnixHTTPConnection(parsed.path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Stale keep-alive connection: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Inference server error {response.status}: {data.get('error')}")
+        return data
+
+    @property
+    def schema(self):
+        with self._meta_lock:
+            if self._schema is None:
+                meta = self._request("GET", "/schema")
+                self._schema = FeatureSchema(meta["schema"]["features"])
+                self.version = meta["model_version"]
+                self.classes_ = np.asarray(meta["classes"])
+            return self._schema
+
+    def refresh(self, max_age=1.0):
+        """The server's current model version, probed via /health at most every `max_age` seconds.
+
+        Callers that key caches on `version` call this first: a hot reload on
+        the server is otherwise only noticed by the next `score_records`. A
+        changed version drops the cached schema so it is refetched.
+        """
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= max_age:
+            version = self.health()["model_version"]
+            self._checked = now
+            if version != self.version:
+                with self._meta_lock:
+                    self._schema = None
+                    self.version = version
+        return self.version
+
+    def score_records(self, records):
+        """Score raw patient records remotely; returns (labels, probabilities)."""
+        data = self._request("POST", "/predict", {"records": list(records)})
+        if data["model_version"] != self.version:
+            with self._meta_lock:
+                self._schema = None  # refetched on next use
+        self.classes_ = np.asarray(data["classes"])
+        return np.asarray(data["labels"]), np.asarray(data["probabilities"])
+
+    def health(self):
+        return self._request("GET", "/health")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url):
+    """Return the process-wide client for `url`."""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = InferenceClient(url)
+        return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the healthcare model over local HTTP with micro-batching.")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Rows per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Longest a row waits for its batch to fill")
+    args = parser.parse_args(argv)
+
+    server = InferenceServer(args.model, args.max_batch_size, args.max_wait_ms / 1000.0)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Serving {args.model} on {where}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import bisect
+import functools
+import os
+import tempfile
+import threading
+import time
+import warnings
+
+# Latency buckets in seconds, from 50 us (a compiled single-row prediction)
+# to 10 s (a cold model load)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Gauge:
+    """A value that can go up and down (e.g. a drift score), per label combination."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class _Series:
+    """One label combination of a histogram: per-bucket counts (the last is +Inf) and their sum."""
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    """Observation counts in fixed buckets plus their sum, per label combination.
+
+    Recording is a binary search over the bucket bounds and two updates
+    under the series' own lock; hot paths resolve their series once with
+    `labels()` and skip the label lookup.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labelvalues, _Series(self.buckets))
+        return series
+
+    def observe(self, value, *labelvalues):
+        self.labels(*labelvalues).observe(value)
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for key, (counts, total) in sorted((key, s.snapshot()) for key, s in series.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, callback):
+        """Call `callback()` before every render, to refresh gauges that are costly to keep current."""
+        with self._lock:
+            if callback not in self._collectors:
+                self._collectors.append(callback)
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            collectors = list(self._collectors)
+        for callback in collectors:
+            callback()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("healthcare_stage_duration_seconds", "Wall time of instrumented stages.",
+                                   ("stage",))
+STAGE_ERRORS = REGISTRY.counter("healthcare_stage_errors_total", "Instrumented stages that raised.", ("stage",))
+EVENTS = REGISTRY.counter("healthcare_events_total", "Counted events (cache hits, reloads, ...).",
+                          ("event",))
+
+# HEALTHCARE_METRICS=0 turns spans into no-ops
+ENABLED = os.environ.get("HEALTHCARE_METRICS", "1") != "0"
+
+
+class span:
+    """Time a block (or, as a decorator, every call) as stage `stage`.
+
+        with span("predict_proba"):
+            ...
+
+    The duration goes to `healthcare_stage_duration_seconds{stage=...}`, and
+    an exception also counts in `healthcare_stage_errors_total`.
+    """
+
+    __slots__ = ("stage", "_series", "_start")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._series = STAGE_SECONDS.labels(stage)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if ENABLED:
+            self._series.observe(time.perf_counter() - self._start)
+            if exc_type is not None:
+                STAGE_ERRORS.inc(1, self.stage)
+        return False
+
+    def __call__(self, fn):
+        series = self._series
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                if ENABLED:
+                    STAGE_ERRORS.inc(1, self.stage)
+                raise
+            finally:
+                if ENABLED:
+                    series.observe(time.perf_counter() - start)
+
+        return wrapper
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere (e.g. the model loader's own timing)."""
+    if ENABLED:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+def count(event, amount=1):
+    if ENABLED:
+        EVENTS.inc(amount, event)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def write_textfile(path):
+    """Write the current metrics to `path` atomically (node_exporter textfile format).
+
+    `{pid}` in the path is replaced by the process id, so every worker of a
+    multi-process deployment writes its own file.
+    """
+    path = path.format(pid=os.getpid())
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+    return path
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def start_file_exporter(path, interval=15.0):
+    """Rewrite `path` every `interval` seconds from a daemon thread (once per path)."""
+    with _exporters_lock:
+        if ("file", path) in _exporters:
+            return _exporters[("file", path)]
+
+        def loop():
+            while True:
+                try:
+                    write_textfile(path)
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        thread = _exporters[("file", path)] = threading.Thread(target=loop, name="metrics-file", daemon=True)
+        thread.start()
+        return thread
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve `GET /metrics` on a daemon thread (once per address); returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # scrapes every few seconds would flood the app's log
+
+    with _exporters_lock:
+        key = ("http", host, port)
+        if key not in _exporters:
+            server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            _exporters[key] = server
+        return _exporters[key]
+
+
+def start_from_env():
+    """Start the exporters configured by HEALTHCARE_METRICS_PORT / HEALTHCARE_METRICS_FILE.
+
+    When the port cannot be bound (e.g. another worker on the node already
+    serves it) and no file is configured, metrics are written to a per-pid
+    textfile in the temp directory instead, so this process's metrics are
+    not lost.
+    """
+    port = os.environ.get("HEALTHCARE_METRICS_PORT")
+    path = os.environ.get("HEALTHCARE_METRICS_FILE")
+    if port:
+        host = os.environ.get("HEALTHCARE_METRICS_HOST", "127.0.0.1")
+        try:
+            start_http_server(int(port), host)
+        except OSError as e:
+            fallback = path or os.path.join(tempfile.gettempdir(), "healthcare_metrics.{pid}.prom")
+            warnings.warn(f"Cannot serve metrics on {host}:{port} ({e}); writing them to "
+                          f"{fallback.format(pid=os.getpid())} instead", RuntimeWarning, stacklevel=2)
+            path = fallback
+    if path:
+        start_file_exporter(path, float(os.environ.get("HEALTHCARE_METRICS_INTERVAL", "15")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the overhead of a metrics span.")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        with span("overhead"):
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"span overhead: {elapsed / args.iterations * 1e9:.0f} ns")
+    print(render())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from features import FeatureSchema
+from tree_engine import CompiledEnsemble
+
+MAGIC = b"HCMODEL\0"
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = ".hcm"
+ALIGNMENT = 64
+
+# Node arrays of a CompiledEnsemble, in file order
+ARRAYS = ["feature", "threshold", "left", "right", "children", "value", "missing_left", "roots", "tree_class",
+          "baseline"]
+# Arrays only some engines carry; readers that predate them ignore the extra entries
+OPTIONAL_ARRAYS = ["cover"]
+
+_PREAMBLE = struct.Struct("<8sII")  # magic, format version, header length
+
+
+class ArtifactError(Exception):
+    """Raised when a model artifact is malformed, of an unknown version or corrupted."""
+
+
+def is_artifact(path):
+    return os.path.splitext(path)[1].lower() == ARTIFACT_SUFFIX
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_artifact(engine, path, schema=None, source=None):
+    """Write a `CompiledEnsemble` (and its feature schema) as a flat artifact.
+
+    Layout: a preamble (magic, format version, header length, header
+    CRC-32), a JSON header, then every node array as raw little-endian bytes
+    at a 64-byte aligned offset. The header records each array's dtype,
+    shape, offset and CRC-32, plus the classes, feature names and encoder
+    mappings. The file is written next to `path` and renamed into place, so
+    readers never see a partial artifact.
+    """
+    arrays = {name: np.ascontiguousarray(getattr(engine, name)) for name in ARRAYS
+              + [name for name in OPTIONAL_ARRAYS if getattr(engine, name, None) is not None]}
+    arrays = {name: a.astype(a.dtype.newbyteorder("<")) for name, a in arrays.items()}
+    meta = {
+        "classes": engine.classes_.tolist(),
+        "feature_names": None if engine.feature_names_in_ is None else [str(c) for c in engine.feature_names_in_],
+        "max_depth": engine.max_depth,
+        "loss": engine.loss,
+    }
+
+    layout, offset = {}, 0
+    for name, a in arrays.items():
+        layout[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset, "nbytes": a.nbytes,
+                        "crc32": zlib.crc32(a.tobytes())}
+        offset = _align(offset + a.nbytes)
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "source": source,
+        "model": meta,
+        "schema": schema.to_dict() if schema is not None else None,
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    data_start = _align(_PREAMBLE.size + 4 + len(header_bytes))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(struct.pack("<I", zlib.crc32(header_bytes)))
+        f.write(header_bytes)
+        for name, a in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return header
+
+
+def read_header(path):
+    """The artifact's JSON header, plus `data_start`, after validating the preamble."""
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size + 4)
+        if len(preamble) < _PREAMBLE.size + 4:
+            raise ArtifactError(f"{path} is too short to be a model artifact")
+        magic, version, header_length = _PREAMBLE.unpack(preamble[:_PREAMBLE.size])
+        if magic != MAGIC:
+            raise ArtifactError(f"{path} is not a model artifact")
+        if version != FORMAT_VERSION:
+            raise ArtifactError(f"Unsupported model artifact version in {path}: {version}")
+        header_bytes = f.read(header_length)
+    (expected_crc,) = struct.unpack("<I", preamble[_PREAMBLE.size:])
+    if len(header_bytes) != header_length or zlib.crc32(header_bytes) != expected_crc:
+        raise ArtifactError(f"Corrupted header in {path}")
+    header = json.loads(header_bytes)
+    header["data_start"] = _align(_PREAMBLE.size + 4 + header_length)
+    return header
+
+
+def load_artifact(path, verify=True):
+    """Memory-map an artifact read-only and return its `CompiledEnsemble`.
+
+    The node arrays are views into the mapping, so every process that loads
+    the same file shares one physical copy through the page cache. With
+    `verify`, each array's CRC-32 is checked, which reads the whole file
+    once. The feature schema, when stored, is attached as `feature_schema`.
+    """
+    header = read_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name in ARRAYS + [name for name in OPTIONAL_ARRAYS if name in header["arrays"]]:
+        spec = header["arrays"][name]
+        start = header["data_start"] + spec["offset"]
+        if start + spec["nbytes"] > len(mapped):
+            raise ArtifactError(f"Truncated model artifact {path}: array {name!r} is incomplete")
+        buffer = mapped[start:start + spec["nbytes"]]
+        if verify and zlib.crc32(buffer) != spec["crc32"]:
+            raise ArtifactError(f"Checksum mismatch for array {name!r} in {path}")
+        arrays[name] = np.frombuffer(buffer, dtype=np.dtype(spec["dtype"])).reshape(spec["shape"])
+
+    meta = header["model"]
+    engine = CompiledEnsemble(
+        feature=arrays["feature"], threshold=arrays["threshold"], left=arrays["left"], right=arrays["right"],
+        value=arrays["value"], missing_left=arrays["missing_left"], roots=arrays["roots"],
+        tree_class=arrays["tree_class"], baseline=arrays["baseline"], classes=meta["classes"],
+        feature_names=meta["feature_names"], max_depth=meta["max_depth"], loss=meta["loss"],
+        children=arrays["children"], cover=arrays.get("cover"),
+    )
+    if header["schema"] is not None:
+        schema = FeatureSchema(header["schema"]["features"])
+        engine.feature_schema = schema.select(meta["feature_names"]) if meta["feature_names"] else schema
+    return engine
+
+
+def convert(model_path, output=None):
+    """Compile a pickled GradientBoostingClassifier into an artifact next to it."""
+    from features import load_schema
+    from model_loader import load_model
+    from tree_engine import compile_model
+
+    output = output or os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+    model = load_model(model_path)
+    engine = compile_model(model)
+    source = {"path": os.path.basename(model_path), "type": type(model).__name__}
+    save_artifact(engine, output, schema=load_schema(model_path, model), source=source)
+    return output, model, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a pickled model to a memory-mapped artifact, or inspect one.")
+    parser.add_argument("model", help=f"Pickled model to convert, or a {ARTIFACT_SUFFIX} artifact to inspect")
+    parser.add_argument("--output", help=f"Artifact path (default: the model path with {ARTIFACT_SUFFIX})")
+    parser.add_argument("--verify", metavar="CSV", help="Check the artifact's predictions against the pickle on these records")
+    args = parser.parse_args(argv)
+
+    if is_artifact(args.model):
+        header = read_header(args.model)
+        start = time.perf_counter()
+        engine = load_artifact(args.model)
+        elapsed = time.perf_counter() - start
+        print(json.dumps({k: v for k, v in header.items() if k != "schema"}, indent=2))
+        print(f"Loaded and verified in {elapsed * 1000:.1f} ms: {engine.n_trees} trees, {engine.nbytes} bytes")
+        return 0
+
+    output, model, engine = convert(args.model, args.output)
+    print(f"Wrote {output} ({os.path.getsize(output)} bytes, {engine.n_trees} trees)")
+    start = time.perf_counter()
+    mapped = load_artifact(output)
+    print(f"Load time: {(time.perf_counter() - start) * 1000:.1f} ms")
+    if args.verify:
+        import pandas as pd
+
+        from features import load_schema
+        from tree_engine import verify
+
+        X = load_schema(args.model, model).encode_frame(pd.read_csv(args.verify))
+        report = verify(model, X, mapped)
+        print(f"Rows checked: {report['rows']}, max |probability difference|: {report['max_abs_diff']:.3e}")
+        print("PASS" if report["passed"] else "FAIL")
+        return 0 if report["passed"] else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
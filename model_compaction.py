@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from explain import node_expectations, node_levels
+from tree_engine import CompiledEnsemble, _flatten
+
+
+def float32_thresholds(threshold):
+    """Thresholds as float32, rounded toward -inf.
+
+    The engine compares float32-rounded features (see `CompiledEnsemble._as_array`).
+    For a float32 `x` and the largest float32 `t32 <= t`, `x > t` holds exactly
+    when `x > t32`, so the smaller thresholds never change a split decision.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def _smallest_int(values):
+    return values.astype(np.int16) if values.size and values.max() < np.iinfo(np.int16).max else values
+
+
+def compact_engine(engine, n_stages=None, max_depth=None, float32=True):
+    """A smaller copy of `engine`: its first `n_stages` boosting stages, pruned to `max_depth`.
+
+    Truncating stages keeps a valid boosted model (sklearn's
+    `staged_decision_function`). Pruning turns every node at `max_depth`
+    into a leaf carrying the cover-weighted mean of the leaves it replaces,
+    and drops the nodes below it. With `float32`, thresholds and leaf values
+    are stored as float32 (split decisions are unchanged, outputs move by
+    about 1e-7).
+    """
+    n_trees = engine.n_trees if n_stages is None else min(n_stages * engine.n_raw, engine.n_trees)
+    n_nodes = len(engine.feature) if n_trees == engine.n_trees else int(engine.roots[n_trees])
+
+    keep = np.zeros(len(engine.feature), dtype=bool)
+    keep[:n_nodes] = True
+    left, right = engine.left.astype(np.intp), engine.right.astype(np.intp)
+    value = np.array(engine.value, dtype=np.float64)
+    new_leaf = np.zeros(len(engine.feature), dtype=bool)
+    depth = engine.max_depth
+    if max_depth is not None and max_depth < engine.max_depth:
+        levels = node_levels(engine)
+        expected = node_expectations(engine, levels)
+        for d, nodes in enumerate(levels):
+            if d == max_depth:
+                new_leaf[nodes] = True
+                value[nodes] = expected[nodes]
+            elif d > max_depth:
+                keep[nodes] = False
+        depth = max_depth
+
+    new_id = np.cumsum(keep) - 1
+    nodes = np.flatnonzero(keep)
+    own = new_id[nodes]
+    is_leaf = new_leaf[nodes] | (left[nodes] == nodes)
+    threshold = np.where(is_leaf, np.inf, engine.threshold[nodes])
+    return CompiledEnsemble(
+        feature=_smallest_int(np.where(is_leaf, 0, engine.feature[nodes])),
+        threshold=float32_thresholds(threshold) if float32 else threshold,
+        left=np.where(is_leaf, own, new_id[left[nodes]]).astype(np.int32),
+        right=np.where(is_leaf, own, new_id[right[nodes]]).astype(np.int32),
+        value=value[nodes].astype(np.float32 if float32 else np.float64),
+        missing_left=engine.missing_left[nodes] & ~is_leaf,
+        roots=new_id[engine.roots[:n_trees]].astype(np.int32),
+        tree_class=engine.tree_class[:n_trees],
+        baseline=engine.baseline,
+        classes=engine.classes_,
+        feature_names=engine.feature_names_in_,
+        max_depth=depth,
+        loss=engine.loss,
+        cover=None if engine.cover is None else np.asarray(engine.cover)[nodes],
+    )
+
+
+def distill(engine, X, n_estimators=30, max_depth=2, learning_rate=0.2, float32=True, random_state=42):
+    """A small student ensemble fitted to reproduce `engine`'s raw scores (log-odds) on `X`.
+
+    The student is a `GradientBoostingRegressor` on the teacher's soft
+    targets, which carry more information than its hard labels, flattened
+    into a `CompiledEnsemble` that shares the teacher's link function.
+    Binary models only.
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    if engine.n_raw != 1:
+        raise ValueError("Distillation supports binary models only")
+    X = engine._as_array(X)
+    student = GradientBoostingRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                        learning_rate=learning_rate, random_state=random_state)
+    student.fit(X, engine.decision_function(X))
+    compiled = CompiledEnsemble(
+        **_flatten(student.estimators_, student.learning_rate),
+        classes=engine.classes_,
+        feature_names=engine.feature_names_in_,
+        loss=engine.loss,
+    )
+    compiled.baseline = np.atleast_1d(student.predict(X[:1])[0]) - compiled._raw_block(X[:1])[0]
+    return compact_engine(compiled, float32=float32)
+
+
+class EarlyExitScorer:
+    """Scores a binary ensemble a block of stages at a time, stopping rows whose label is settled.
+
+    Every tree's output lies between its smallest and largest leaf value,
+    so after each block the remaining trees can move a row's raw score by
+    at most a known amount. Once that cannot carry the score across the
+    decision threshold the row stops. With `slack=1.0` labels always match
+    the full ensemble; a smaller `slack` trusts a fraction of the remaining
+    range and stops earlier at some risk of flipping borderline rows.
+    Probabilities of stopped rows come from their partial score, so they are
+    not the full model's probabilities.
+
+    The leaf-value bounds are loose: on the bundled model most rows still
+    evaluate nearly every tree and the scorer is slower than the plain
+    compiled engine. It is therefore only a tier in the compaction report
+    (compare its trees evaluated and latency there), not a serving path.
+
+    Stands in for the estimator like `CompiledEnsemble` (`predict_proba`,
+    `predict`, `classes_`, `feature_names_in_`).
+    """
+
+    def __init__(self, engine, block_stages=10, slack=1.0, threshold=0.5):
+        if engine.n_raw != 1:
+            raise ValueError("Early exit supports binary models only")
+        self.engine = engine
+        self.classes_ = engine.classes_
+        self.feature_names_in_ = engine.feature_names_in_
+        self.slack = slack
+        logit = np.log(threshold / (1.0 - threshold))
+        self.raw_threshold = logit / 2.0 if engine.loss == "exponential" else logit
+
+        n_nodes = len(engine.feature)
+        leaves = np.flatnonzero(engine.left == np.arange(n_nodes))
+        tree_of_leaf = np.searchsorted(engine.roots, leaves, side="right") - 1
+        low = np.full(engine.n_trees, np.inf)
+        high = np.full(engine.n_trees, -np.inf)
+        np.minimum.at(low, tree_of_leaf, engine.value[leaves])
+        np.maximum.at(high, tree_of_leaf, engine.value[leaves])
+
+        self.blocks = [(start, min(start + block_stages, engine.n_trees))
+                       for start in range(0, engine.n_trees, block_stages)]
+        # Range the trees after each block can still add
+        self._remaining_low = [low[stop:].sum() for _, stop in self.blocks]
+        self._remaining_high = [high[stop:].sum() for _, stop in self.blocks]
+
+    @property
+    def nbytes(self):
+        return self.engine.nbytes
+
+    def decision_function(self, X, return_trees=False):
+        engine = self.engine
+        X = engine._as_array(X)
+        raw = np.full(len(X), float(engine.baseline[0]))
+        trees = np.zeros(len(X), dtype=np.int32)
+        active = np.arange(len(X))
+        for b, (start, stop) in enumerate(self.blocks):
+            if not len(active):
+                break
+            block = X if len(active) == len(X) else X[active]
+            raw[active] += engine.value.take(engine.leaves(block, trees=slice(start, stop))).sum(axis=1,
+                                                                                               dtype=np.float64)
+            trees[active] = stop
+            score = raw[active]
+            settled = (score + self.slack * self._remaining_low[b] > self.raw_threshold) | \
+                      (score + self.slack * self._remaining_high[b] <= self.raw_threshold)
+            active = active[~settled]
+        return (raw, trees) if return_trees else raw
+
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        p = 1.0 / (1.0 + np.exp(-(2.0 * raw if self.engine.loss == "exponential" else raw)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def _latency(model, X, repeat=200):
+    # Median single-row latency and batch throughput, like hyperparameter_search does
+    row = X[:1]
+    model.predict_proba(row)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch_seconds = time.perf_counter() - start
+    return float(np.median(timings)), len(X) / batch_seconds if batch_seconds else float("inf")
+
+
+def evaluate_tier(model, X, y, reference):
+    """Accuracy/AUC against `y`, agreement with the full model's `reference` probabilities, latency and memory."""
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    from model_loader import estimate_size
+
+    proba = model.predict_proba(X)
+    labels = np.asarray(model.classes_)[proba.argmax(axis=1)]
+    reference_labels = np.asarray(model.classes_)[reference.argmax(axis=1)]
+    result = {
+        "accuracy": float(accuracy_score(y, labels)),
+        "auc": float(roc_auc_score(y, proba[:, 1])) if len(np.unique(y)) == 2 else None,
+        "agreement": float((labels == reference_labels).mean()),
+        "max_proba_diff": float(np.abs(proba - reference).max()),
+    }
+    if isinstance(model, EarlyExitScorer):
+        result["mean_trees"] = float(model.decision_function(X, return_trees=True)[1].mean())
+    else:
+        result["mean_trees"] = float(model.n_trees if isinstance(model, CompiledEnsemble) else model.estimators_.size)
+    result["latency_us"], result["rows_per_second"] = _latency(model, X)
+    result["latency_us"] *= 1e6
+    result["memory_bytes"] = estimate_size(model)
+    return result
+
+
+def build_tiers(model, X_train, stages=None, depth=None, distill_estimators=30, distill_depth=2,
+                block_stages=10, slack=1.0):
+    """Name -> model for every deployment tier derived from the fitted `model`."""
+    from tree_engine import compile_model
+
+    full = compile_model(model)
+    n_stages = full.n_trees // full.n_raw
+    stages = stages or max(1, n_stages // 2)
+    depth = depth or max(1, full.max_depth - 1)
+    tiers = {
+        "sklearn": model,
+        "compiled": full,
+        "float32": compact_engine(full),
+        f"truncated_s{stages}": compact_engine(full, n_stages=stages),
+        f"pruned_s{stages}_d{depth}": compact_engine(full, n_stages=stages, max_depth=depth),
+    }
+    if full.n_raw == 1:
+        tiers[f"distilled_{distill_estimators}x{distill_depth}"] = distill(full, X_train, distill_estimators,
+                                                                            distill_depth)
+        tiers["early_exit"] = EarlyExitScorer(full, block_stages, slack)
+        tiers["early_exit_float32"] = EarlyExitScorer(tiers["float32"], block_stages, slack)
+    return tiers
+
+
+def print_report(rows, file=sys.stdout):
+    header = f"{'tier':<24}{'accuracy':>9}{'auc':>8}{'agree':>8}{'trees':>8}{'latency':>12}{'rows/s':>12}{'memory':>11}"
+    print(header, file=file)
+    print("-" * len(header), file=file)
+    for name, r in rows.items():
+        auc = f"{r['auc']:.4f}" if r["auc"] is not None else "n/a"
+        memory = f"{r['memory_bytes'] / 1024:.0f} KiB" if r["memory_bytes"] is not None else "n/a"
+        print(f"{name:<24}{r['accuracy']:>9.4f}{auc:>8}{r['agreement']:>8.4f}{r['mean_trees']:>8.1f}"
+              f"{r['latency_us']:>9.0f} us{r['rows_per_second']:>12.0f}{memory:>11}", file=file)
+
+
+def main(argv=None):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    from features import load_schema
+    from model_artifact import ARTIFACT_SUFFIX, save_artifact
+    from model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Build compact deployment tiers of a model and compare them.")
+    parser.add_argument("data", help="CSV with raw patient records (held-out part is used for the report)")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--target", help="Label column in the data (default: compare against the full model)")
+    parser.add_argument("--stages", type=int, help="Boosting stages to keep when pruning (default: half)")
+    parser.add_argument("--depth", type=int, help="Tree depth to prune to (default: one less)")
+    parser.add_argument("--distill-estimators", type=int, default=30, help="Trees in the distilled student")
+    parser.add_argument("--distill-depth", type=int, default=2, help="Depth of the distilled student's trees")
+    parser.add_argument("--block-stages", type=int, default=10, help="Stages scored between early-exit checks")
+    parser.add_argument("--slack", type=float, default=1.0,
+                        help="Fraction of the remaining score range early exit guards against (1.0 = exact labels)")
+    parser.add_argument("--report", default="compaction_report.json", help="Where to write the comparison")
+    parser.add_argument("--output-dir", help=f"Write every compact tier as a {ARTIFACT_SUFFIX} artifact here")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    schema = load_schema(args.model, model)
+    data = pd.read_csv(args.data)
+    X = schema.encode_array(data)
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    tiers = build_tiers(model, X[train_idx], args.stages, args.depth, args.distill_estimators,
+                        args.distill_depth, args.block_stages, args.slack)
+
+    X_test = X[test_idx]
+    if getattr(model, "feature_names_in_", None) is not None:
+        X_test_sklearn = pd.DataFrame(X_test, columns=model.feature_names_in_)
+    else:
+        X_test_sklearn = X_test
+    reference = tiers["compiled"].predict_proba(X_test)
+    if args.target:
+        y = data[args.target].to_numpy()[test_idx]
+        if not np.isin(y, model.classes_).all():
+            # Raw labels; training encoded them with LabelEncoder (sorted order)
+            y = np.searchsorted(np.unique(data[args.target]), y)
+    else:
+        y = np.asarray(model.classes_)[reference.argmax(axis=1)]
+
+    rows = {}
+    for name, tier in tiers.items():
+        rows[name] = evaluate_tier(tier, X_test_sklearn if tier is model else X_test, y, reference)
+    print(f"{len(X_test)} held-out rows; {'labels from ' + args.target if args.target else 'reference: full model'}")
+    print_report(rows)
+
+    with open(args.report, "w") as f:
+        json.dump({"model": args.model, "data": args.data, "rows": len(X_test), "target": args.target,
+                   "tiers": rows}, f, indent=2)
+    print(f"Report written to {args.report}")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        base = os.path.splitext(os.path.basename(args.model))[0]
+        for name, tier in tiers.items():
+            if isinstance(tier, CompiledEnsemble) and name != "compiled":
+                path = os.path.join(args.output_dir, f"{base}-{name}{ARTIFACT_SUFFIX}")
+                save_artifact(tier, path, schema=schema, source={"path": os.path.basename(args.model),
+                                                                 "type": type(model).__name__, "tier": name})
+                print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
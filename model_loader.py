@@ -0,0 +1,163 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import metrics
+
+
+def _default_load(path):
+    # Memory-mapped artifacts (see model_artifact.py) by extension, pickles
+    # otherwise; both imported on first load so importing this module stays cheap
+    from model_artifact import is_artifact, load_artifact
+
+    if is_artifact(path):
+        return load_artifact(path)
+    import joblib
+
+    return joblib.load(path)
+
+
+class ModelLoadError(Exception):
+    """Raised when a model artifact exists but cannot be deserialized."""
+
+
+def file_digest(path, chunk_size=1 << 20):
+    # SHA-256 of the artifact, read in chunks so large models do not spike memory
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def estimate_size(obj):
+    # Pickled size is a cheap, stable proxy for the in-memory footprint of a
+    # fitted estimator (its weight is almost entirely in NumPy buffers).
+    # Compiled engines report their node arrays directly; for a mapped
+    # artifact those pages are shared with every other process on the node
+    if isinstance(getattr(obj, "nbytes", None), int):
+        return obj.nbytes
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+
+
+class ModelLoader:
+    """Loads a model artifact once and reloads it when the file changes.
+
+    The loaded model is shared by every caller in the process. Each `get()`
+    only stats the file; the artifact is re-hashed when its mtime or size
+    changes and deserialized again only when the hash differs. The new model
+    is swapped in under a lock, so readers always see a complete model.
+    """
+
+    def __init__(self, path, load_fn=None, check_interval=1.0):
+        self.path = os.path.abspath(path)
+        self.load_fn = load_fn or _default_load
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._model = None
+        self._stat = None
+        self._last_check = 0.0
+        self.version = None
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.loaded_at = None
+        self.reload_count = 0
+        self.last_error = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call `callback(loader)` whenever a new model version is swapped in."""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def get(self):
+        now = time.monotonic()
+        if self._model is not None and now - self._last_check < self.check_interval:
+            return self._model
+        with self._lock:
+            self._last_check = now
+            try:
+                stat = os.stat(self.path)
+                key = (stat.st_mtime_ns, stat.st_size)
+                if self._model is None or key != self._stat:
+                    self._refresh(key)
+            except (OSError, ModelLoadError) as e:
+                # A half-written or missing artifact during a deploy must not take
+                # down sessions that already have a working model
+                if self._model is None:
+                    raise
+                self.last_error = str(e)
+            return self._model
+
+    def snapshot(self):
+        """(model, version) from the same load, even if a reload happens concurrently."""
+        self.get()
+        with self._lock:
+            return self._model, self.version
+
+    def _refresh(self, key):
+        digest = file_digest(self.path)
+        if self._model is not None and digest == self.version:
+            # Touched but unchanged: keep the current model
+            self._stat = key
+            return
+
+        start = time.perf_counter()
+        try:
+            model = self.load_fn(self.path)
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            metrics.count("model_load_error")
+            raise ModelLoadError(f"Could not load model from {self.path}: {e}") from e
+        elapsed = time.perf_counter() - start
+        metrics.observe("model_load", elapsed)
+        metrics.count("model_reload")
+
+        # Swap everything in one step once the new model is fully built
+        self._model = model
+        self._stat = key
+        self.version = digest
+        self.load_seconds = elapsed
+        self.memory_bytes = estimate_size(model)
+        self.loaded_at = time.time()
+        self.reload_count += 1
+        self.last_error = None
+        for callback in self._listeners:
+            callback(self)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "load_seconds": self.load_seconds,
+            "memory_bytes": self.memory_bytes,
+            "loaded_at": self.loaded_at,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+        }
+
+
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def get_loader(path, **kwargs):
+    """Return the process-wide loader for `path`, creating it on first use."""
+    key = os.path.abspath(path)
+    with _loaders_lock:
+        loader = _loaders.get(key)
+        if loader is None:
+            loader = _loaders[key] = ModelLoader(key, **kwargs)
+        return loader
+
+
+def load_model(path):
+    """Return the shared model for `path`, reloading it if the file changed."""
+    return get_loader(path).get()
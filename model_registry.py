@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import time
+
+import joblib
+
+from drift_monitor import profile_path
+from features import schema_path
+from model_loader import file_digest
+
+MANIFEST_VERSION = 1
+
+
+class ModelRegistry:
+    """Versioned model artifacts in one directory, described by `manifest.json`.
+
+    Every registered model is written as `model-vNNNN.pkl` with its feature
+    schema next to it (and a memory-mapped `.hcm` artifact when the model
+    can be compiled). The manifest records, per version, the parent version,
+    training mode, data, target classes, the training caches it has seen
+    and its evaluation metrics, so each model can be traced back and
+    extended by the next incremental run.
+    """
+
+    def __init__(self, directory="models"):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported model manifest version in {self.manifest_path}: "
+                                 f"{self.manifest.get('version')}")
+        else:
+            self.manifest = {"version": MANIFEST_VERSION, "models": []}
+
+    @property
+    def models(self):
+        return self.manifest["models"]
+
+    def latest(self):
+        return self.models[-1] if self.models else None
+
+    def get(self, version):
+        for entry in self.models:
+            if entry["version"] == version:
+                return entry
+        raise KeyError(f"No model version {version} in {self.manifest_path}")
+
+    def path(self, entry):
+        return os.path.join(self.directory, entry["path"])
+
+    def register(self, model, schema, publish_to=None, profile=None, **metadata):
+        """Save `model` as the next version and record it in the manifest.
+
+        `profile` (a `drift_monitor.DriftProfile` of the training inputs) is
+        saved next to the model and published with it.
+
+        With `publish_to`, the model and its schema are also copied to that
+        serving path and renamed into place, so a running app or inference
+        server hot-reloads the new version.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        version = (self.latest()["version"] + 1) if self.models else 1
+        name = f"model-v{version:04d}"
+        path = os.path.join(self.directory, name + ".pkl")
+        joblib.dump(model, path)
+        schema.save(schema_path(path))
+        if profile is not None:
+            profile.save(profile_path(path))
+
+        artifact = None
+        try:
+            from model_artifact import ARTIFACT_SUFFIX, save_artifact
+            from tree_engine import compile_model
+
+            artifact = name + ARTIFACT_SUFFIX
+            save_artifact(compile_model(model), os.path.join(self.directory, artifact), schema=schema,
+                          source={"path": name + ".pkl", "type": type(model).__name__})
+        except TypeError:
+            artifact = None  # not a GradientBoostingClassifier; served from the pickle
+
+        entry = {
+            "version": version,
+            "path": name + ".pkl",
+            "artifact": artifact,
+            "sha256": file_digest(path),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            **metadata,
+        }
+        self.models.append(entry)
+        self._save_manifest()
+        if publish_to:
+            self.publish(entry, publish_to)
+        return entry
+
+    def publish(self, entry, destination):
+        """Copy a registered version to `destination` (with its schema and drift profile) atomically."""
+        source = self.path(entry)
+        files = [(schema_path(source), schema_path(destination)), (source, destination)]
+        if os.path.exists(profile_path(source)):
+            files.insert(0, (profile_path(source), profile_path(destination)))
+        for src, dst in files:
+            tmp = dst + ".tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2, default=str)
+        os.replace(tmp, self.manifest_path)
@@ -1,49 +1,240 @@
+import argparse
+import json
+import os
+
+import numpy as np
 import pandas as pd
 import joblib
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
 
-# Load the dataset
-file_path = 'credit_underwriting1.csv'  # Update the file path as needed
-data = pd.read_csv(file_path)
+from drift_monitor import DriftProfile, profile_path
+from features import FeatureSchema, load_schema, schema_path
+from training_data import StageProfiler, TrainingCache, prepare_cache
 
-# Preprocessing
-# Encode categorical variables
+file_path = 'credit_underwriting1.csv'  # Update the file path as needed
+model_path = 'best_features_model.pkl'
 categorical_columns = ['gender', 'marital_status', 'employee_status', 'residence_type', 'loan_purpose']
-label_encoders = {}
-for col in categorical_columns:
-    le = LabelEncoder()
-    data[col] = le.fit_transform(data[col])
-    label_encoders[col] = le
+id_column = 'loan_id'
+target_column = 'loan_status'
+
+
+def train_standard(args):
+    # Load the dataset
+    data = pd.read_csv(args.data)
+
+    # Preprocessing
+    # Encode categorical variables with the shared feature schema (the app and
+    # batch scoring load the same schema, so serving encodes exactly like training)
+    schema = FeatureSchema.fit(data, categorical_columns, exclude=[id_column, target_column])
+
+    # Encode the target variable
+    label_encoder_status = LabelEncoder()
+    data[target_column] = label_encoder_status.fit_transform(data[target_column])
+
+    # Define features and target
+    X = schema.encode_frame(data)  # Excludes ID and target
+    y = data[target_column]
+
+    # Split the dataset into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Initialize the Gradient Boosting Classifier
+    model = GradientBoostingClassifier(random_state=42)
+
+    # Train the model
+    model.fit(X_train, y_train)
+
+    # Save the model with feature names explicitly added, its feature schema and the
+    # training inputs' reference profile (for drift monitoring) next to it
+    model.feature_names_in_ = X.columns.tolist()
+    joblib.dump(model, args.output)
+    schema.save(schema_path(args.output))
+    DriftProfile.fit(X_train, schema).save(profile_path(args.output))
+
+    # Evaluate the model
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    classification_report_result = classification_report(y_test, y_pred)
+
+    print(f"Accuracy: {accuracy:.2f}")
+    print("Classification Report:")
+    print(classification_report_result)
+
+
+def train_out_of_core(args):
+    # Stream the CSV into a memory-mapped cache (reused on later runs), then fit a
+    # histogram-based booster that bins the mapped data without copying it
+    profiler = StageProfiler()
+    cache = prepare_cache(args.data, categorical_columns, target_column, exclude=[id_column],
+                          cache_dir=args.cache_dir, chunk_size=args.chunk_size, profiler=profiler)
+
+    with profiler.stage("fit"):
+        # Label codes are < 255, so the booster can split on them natively
+        categorical = np.array([f["kind"] == "code" and len(f["categories"]) < 255 for f in cache.schema.features])
+        model = HistGradientBoostingClassifier(
+            categorical_features=categorical if categorical.any() else None,
+            early_stopping=False,  # avoids an internal train/validation copy of X
+            random_state=42,
+        )
+        model.fit(cache.X_train, cache.y_train)
+
+    with profiler.stage("evaluate"):
+        X_test, y_test = cache.X_test, cache.y_test
+        y_pred = np.concatenate([model.predict(X_test[i:i + args.chunk_size])
+                                 for i in range(0, len(X_test), args.chunk_size)]) if len(X_test) else np.array([])
+
+    with profiler.stage("save"):
+        model.feature_names_in_ = np.asarray(cache.columns, dtype=object)
+        joblib.dump(model, args.output)
+        cache.schema.save(schema_path(args.output))
+        DriftProfile.fit(cache.X_train, cache.schema).save(profile_path(args.output))
+
+    print(f"Rows: {cache.meta['train_rows']} train / {cache.meta['test_rows']} test (cache: {cache.directory})")
+    print(f"Accuracy: {accuracy_score(y_test, y_pred):.2f}")
+    print("Classification Report:")
+    print(classification_report(y_test, y_pred, labels=range(len(cache.classes)),
+                                target_names=[str(c) for c in cache.classes]))
+    profiler.report()
+
+
+def train_incremental(args):
+    # Add boosting stages fitted on a new batch on top of the current model (warm start).
+    # The batch is encoded with the base model's feature schema and target classes, so
+    # the new stages see exactly the codes the existing trees were trained on.
+    from model_registry import ModelRegistry
+
+    profiler = StageProfiler()
+    registry = ModelRegistry(args.models_dir)
+    parent = registry.latest()
+    base_path = args.base_model or (registry.path(parent) if parent else args.output)
+
+    with profiler.stage("load base"):
+        model = joblib.load(base_path)
+        schema = load_schema(base_path, model)
+        classes = parent.get("target_classes") if parent and not args.base_model else None
+
+    cache = prepare_cache(args.data, categorical_columns, target_column, exclude=[id_column],
+                          cache_dir=args.cache_dir, chunk_size=args.chunk_size, profiler=profiler,
+                          schema=schema, classes=classes)
+    if len(cache.classes) != len(model.classes_):
+        raise SystemExit(f"{args.data} has {len(cache.classes)} target classes, the base model {len(model.classes_)}")
+
+    with profiler.stage("fit"):
+        X, y = cache.X_train, cache.y_train
+        # Optionally replay a sample of the data earlier versions were trained on, so the
+        # new stages correct recent errors without forgetting older patterns
+        seen = list(parent.get("training_caches", [])) if parent and not args.base_model else []
+        if args.replay > 0:
+            rng = np.random.default_rng(42)
+            replay_X, replay_y = [X], [y]
+            for directory in seen:
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    continue
+                previous = TrainingCache(directory)
+                rows = np.sort(rng.choice(len(previous.y_train), int(len(previous.y_train) * args.replay),
+                                          replace=False))
+                replay_X.append(previous.X_train[rows])
+                replay_y.append(previous.y_train[rows])
+            X, y = np.concatenate(replay_X), np.concatenate(replay_y)
+
+        before = _n_stages(model)
+        if isinstance(model, GradientBoostingClassifier):
+            model.set_params(warm_start=True, n_estimators=before + args.add_estimators)
+        elif isinstance(model, HistGradientBoostingClassifier):
+            model.set_params(warm_start=True, max_iter=before + args.add_estimators)
+        else:
+            raise SystemExit(f"Incremental training is not supported for {type(model).__name__}")
+        # The standard GradientBoostingClassifier was fitted on named columns
+        X_test = pd.DataFrame(cache.X_test, columns=cache.columns) \
+            if isinstance(model, GradientBoostingClassifier) else cache.X_test
+        base_accuracy = accuracy_score(cache.y_test, model.predict(X_test)) if len(cache.y_test) else None
+        model.fit(X, y)
+        model.feature_names_in_ = np.asarray(cache.columns, dtype=object)
+
+    with profiler.stage("evaluate"):
+        accuracy = accuracy_score(cache.y_test, model.predict(X_test)) if len(cache.y_test) else None
+
+    with profiler.stage("save"):
+        # Live inputs are compared against the batch the newest stages were fitted on
+        entry = registry.register(
+            model, cache.schema, publish_to=args.output, profile=DriftProfile.fit(cache.X_train, cache.schema),
+            parent=parent["version"] if parent and not args.base_model else None,
+            base=os.path.abspath(base_path),
+            mode="incremental",
+            data=os.path.abspath(args.data),
+            rows=int(len(y)),
+            stages=[before, _n_stages(model)],
+            target_classes=[c.item() if hasattr(c, "item") else c for c in cache.classes],
+            training_caches=seen + [os.path.abspath(cache.directory)],
+            metrics={"holdout_accuracy_before": base_accuracy, "holdout_accuracy": accuracy},
+        )
+
+    print(f"Version {entry['version']}: {before} -> {_n_stages(model)} stages on {len(y)} rows "
+          f"(published to {args.output})")
+    if accuracy is not None:
+        print(f"Holdout accuracy on the new batch: {base_accuracy:.4f} -> {accuracy:.4f}")
+    profiler.report()
+
+
+def _n_stages(model):
+    return int(getattr(model, "n_estimators_", None) or getattr(model, "n_iter_", 0))
 
-# Encode the target variable
-label_encoder_status = LabelEncoder()
-data['loan_status'] = label_encoder_status.fit_transform(data['loan_status'])
 
-# Define features and target
-X = data.drop(columns=['loan_id', 'loan_status'])  # Exclude ID and target
-y = data['loan_status']
+def search(args):
+    # Cross-validated grid search over the cached, memory-mapped training split
+    from hyperparameter_search import print_leaderboard, run_search
 
-# Split the dataset into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    cache = prepare_cache(args.data, categorical_columns, target_column, exclude=[id_column],
+                          cache_dir=args.cache_dir, chunk_size=args.chunk_size)
+    grid = None
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    rows = run_search(cache, grid, kind=args.estimator, n_folds=args.folds, workers=args.workers,
+                      results_dir=args.results_dir)
+    print_leaderboard(rows)
+    with open(args.leaderboard, "w") as f:
+        json.dump(rows, f, indent=2)
+    print(f"Leaderboard written to {args.leaderboard}")
 
-# Initialize the Gradient Boosting Classifier
-model = GradientBoostingClassifier(random_state=42)
 
-# Train the model
-model.fit(X_train, y_train)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the underwriting model.")
+    parser.add_argument("--mode", choices=["standard", "out-of-core", "search", "incremental"], default="standard",
+                        help="standard: in-memory GradientBoostingClassifier; "
+                             "out-of-core: chunked, cached, histogram-based booster; "
+                             "search: cross-validated hyperparameter search; "
+                             "incremental: add stages to the current model on a new batch")
+    parser.add_argument("--data", default=file_path, help="Training CSV")
+    parser.add_argument("--output", default=model_path, help="Where to save the trained model")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk (out-of-core)")
+    parser.add_argument("--cache-dir", default=".cache/training", help="Preprocessed data cache (out-of-core, search)")
+    parser.add_argument("--grid", help="JSON file mapping parameter names to candidate values (search)")
+    parser.add_argument("--estimator", choices=["gbc", "hist"], default="gbc", help="Model family to search")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds (search)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (search, default: all cores)")
+    parser.add_argument("--results-dir", default=".cache/search", help="Per-fold result cache (search)")
+    parser.add_argument("--leaderboard", default="leaderboard.json", help="Where to write the leaderboard (search)")
+    parser.add_argument("--models-dir", default="models", help="Versioned models and manifest (incremental)")
+    parser.add_argument("--base-model", help="Model to extend (incremental, default: the latest version, "
+                                             "else --output)")
+    parser.add_argument("--add-estimators", type=int, default=50, help="Boosting stages to add (incremental)")
+    parser.add_argument("--replay", type=float, default=0.0,
+                        help="Fraction of earlier versions' training rows to refit on (incremental)")
+    args = parser.parse_args(argv)
 
-# Save the model with feature names explicitly added
-model.feature_names_in_ = X.columns.tolist()
-joblib.dump(model, 'best_features_model.pkl')
+    if args.mode == "out-of-core":
+        train_out_of_core(args)
+    elif args.mode == "search":
+        search(args)
+    elif args.mode == "incremental":
+        train_incremental(args)
+    else:
+        train_standard(args)
 
-# Evaluate the model
-y_pred = model.predict(X_test)
-accuracy = accuracy_score(y_test, y_pred)
-classification_report_result = classification_report(y_test, y_pred)
 
-print(f"Accuracy: {accuracy:.2f}")
-print("Classification Report:")
-print(classification_report_result)
+if __name__ == "__main__":
+    main()
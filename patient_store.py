@@ -0,0 +1,438 @@
+import argparse
+import datetime
+import math
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+STORE_VERSION = 1
+
+# Categorical fields are stored as their index in these lists (the app's options)
+CHOICES = {
+    "gender": ["Male", "Female"],
+    "smoking_status": ["Non-smoker", "Smoker"],
+    "alcohol_consumption": ["None", "Light", "Moderate", "Heavy"],
+    "physical_activity": ["None", "Light", "Moderate", "Heavy"],
+    "family_history": ["No", "Yes"],
+    "diet": ["Balanced", "Unbalanced", "Vegetarian", "Vegan"],
+    "stress_level": ["Low", "Moderate", "High"],
+}
+
+# Per-visit fields and their SQLite column types, in table order
+VISIT_FIELDS = [
+    ("age", "INTEGER"),
+    ("gender", "INTEGER"),
+    ("blood_pressure", "INTEGER"),
+    ("cholesterol", "INTEGER"),
+    ("bmi", "REAL"),
+    ("glucose", "INTEGER"),
+    ("smoking_status", "INTEGER"),
+    ("alcohol_consumption", "INTEGER"),
+    ("physical_activity", "INTEGER"),
+    ("family_history", "INTEGER"),
+    ("diet", "INTEGER"),
+    ("sleep_hours", "INTEGER"),
+    ("stress_level", "INTEGER"),
+    ("heart_rate", "INTEGER"),
+    ("oxygen_saturation", "INTEGER"),
+    ("waist_circumference", "INTEGER"),
+    ("hip_circumference", "INTEGER"),
+    ("fasting_blood_sugar", "REAL"),
+    ("post_meal_blood_sugar", "REAL"),
+    ("hba1c", "REAL"),
+    ("symptoms", "TEXT"),
+    ("diagnosis", "TEXT"),
+    ("treatment", "TEXT"),
+]
+VISIT_COLUMNS = [name for name, _ in VISIT_FIELDS]
+DIABETES_SERIES = ["fasting_blood_sugar", "post_meal_blood_sugar", "hba1c"]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY,
+    patient_key TEXT NOT NULL UNIQUE,
+    full_name TEXT
+);
+CREATE TABLE IF NOT EXISTS visits (
+    patient INTEGER NOT NULL REFERENCES patients(id),
+    visit_date INTEGER NOT NULL,
+    {", ".join(f"{name} {kind}" for name, kind in VISIT_FIELDS)},
+    PRIMARY KEY (patient, visit_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS visits_by_date ON visits (visit_date);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session, seq)
+) WITHOUT ROWID;
+"""
+
+
+def _day(value):
+    """Visit dates are stored as proleptic Gregorian ordinals (one small integer per day)."""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    elif value is None:
+        value = datetime.date.today()
+    return value.toordinal()
+
+
+def _encode(field, value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == "":
+        return None
+    if field in CHOICES:
+        try:
+            return CHOICES[field].index(value)
+        except ValueError:
+            raise ValueError(f"Unknown {field} {value!r}; expected one of {CHOICES[field]}") from None
+    if hasattr(value, "item"):
+        value = value.item()  # NumPy scalars from pandas
+    return value
+
+
+def _decode(field, value):
+    if value is not None and field in CHOICES:
+        return CHOICES[field][value]
+    return value
+
+
+def patient_key(details):
+    """Identify a patient by their ID when one was entered, else by name."""
+    return str(details.get("patient_id") or details.get("full_name") or "").strip()
+
+
+class PatientStore:
+    """Patient visits in a local SQLite database in WAL mode.
+
+    Each visit is one row of typed columns, with categorical fields stored
+    as small integer codes (see CHOICES) and the date as a day ordinal.
+    Visits are clustered by (patient, date), so one patient's history or a
+    date range of it is a single index range scan. A second index on the
+    date serves cohort-wide range queries. Chat messages that overflow an
+    app session's in-memory history (chat_history.py) are kept in
+    `chat_messages`, clustered by (session, seq).
+
+    Reads borrow a connection from a pool that grows to the number of
+    concurrent readers; connections outlive the calling thread, which
+    matters because Streamlit runs every rerun on a new thread. With WAL
+    reads never wait for a writer. Writes are serialized on one background
+    thread with its own connection. `save_visit` returns a Future, so the
+    UI never blocks on the write lock.
+    """
+
+    def __init__(self, path="patients.db", timeout=30.0):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self._readers = queue.LifoQueue()  # idle read connections
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="patient-store")
+        conn = self._write_conn = self._connect()
+        with conn:
+            conn.executescript(_SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+        version = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+        if version != STORE_VERSION:
+            raise ValueError(f"Unsupported patient store version in {self.path}: {version}")
+
+    def _connect(self):
+        # Shared across threads, but only ever used by one thread at a time
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; safe with WAL
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    # --- writes (run on the writer thread) ---
+
+    def _patient_ids(self, conn, names):
+        conn.executemany(
+            "INSERT INTO patients (patient_key, full_name) VALUES (?, ?) "
+            "ON CONFLICT (patient_key) DO UPDATE SET full_name = COALESCE(excluded.full_name, full_name)",
+            names.items(),
+        )
+        ids = {}
+        keys = list(names)
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = conn.execute(f"SELECT patient_key, id FROM patients WHERE patient_key IN "
+                                f"({','.join('?' * len(batch))})", batch)
+            ids.update(rows)
+        return ids
+
+    def _write_rows(self, names, rows):
+        # names: {patient key: full name or None}; rows: [(key, day, *encoded visit fields)].
+        # One transaction for the whole batch.
+        conn = self._write_conn
+        with conn:
+            ids = self._patient_ids(conn, names)
+            columns = ", ".join(VISIT_COLUMNS)
+            updates = ", ".join(f"{c} = excluded.{c}" for c in VISIT_COLUMNS)
+            conn.executemany(
+                f"INSERT INTO visits (patient, visit_date, {columns}) "
+                f"VALUES ({', '.join('?' * (len(VISIT_COLUMNS) + 2))}) "
+                f"ON CONFLICT (patient, visit_date) DO UPDATE SET {updates}",
+                ((ids[row[0]], *row[1:]) for row in rows),
+            )
+        return len(rows)
+
+    def save_visit(self, details, visit_date=None):
+        """Store `details` (a patient_details dict) as the visit on `visit_date` (default today).
+
+        A second save for the same patient and day replaces that visit.
+        Returns a Future that resolves once the write has committed.
+        """
+        key = patient_key(details)
+        if not key:
+            raise ValueError("A patient ID or full name is required to save a visit")
+        # Encoded on the caller's thread so bad input is reported where it was entered
+        row = (key, _day(visit_date), *(_encode(c, details.get(c)) for c in VISIT_COLUMNS))
+        return self._writer.submit(self._write_rows, {key: details.get("full_name") or None}, [row])
+
+    def import_records(self, records, batch_size=10000):
+        """Bulk-insert historical visits from an iterable of dicts.
+
+        Each record needs `patient_id` (or `full_name`) and `visit_date`, plus
+        any of the visit fields. Records are written `batch_size` at a time,
+        one transaction per batch. Returns the number of visits written.
+        """
+        def batches():
+            names, rows = {}, []
+            for record in records:
+                key = patient_key(record)
+                if not key:
+                    raise ValueError(f"Record without patient_id or full_name: {record!r}")
+                names[key] = record.get("full_name") or names.get(key)
+                rows.append((key, _day(record.get("visit_date")),
+                             *(_encode(c, record.get(c)) for c in VISIT_COLUMNS)))
+                if len(rows) >= batch_size:
+                    yield names, rows
+                    names, rows = {}, []
+            if rows:
+                yield names, rows
+
+        return self._pipeline(batches())
+
+    def import_frame(self, frames):
+        """Bulk-insert visits from DataFrames (e.g. `scoring.iter_chunks`), one transaction per frame.
+
+        Columns are encoded whole rather than row by row, and each frame is
+        written while the next one is being read.
+        """
+        return self._pipeline(self._encode_frame(frame) for frame in frames)
+
+    def _pipeline(self, batches):
+        # Keep one batch committing on the writer thread while the next is prepared
+        written, pending = 0, None
+        for names, rows in batches:
+            if pending is not None:
+                written += pending.result()
+            pending = self._writer.submit(self._write_rows, names, rows)
+        if pending is not None:
+            written += pending.result()
+        return written
+
+    @staticmethod
+    def _encode_frame(frame):
+        import pandas as pd
+
+        if "patient_id" in frame:
+            ids = frame["patient_id"].astype("string").str.strip()
+            if "full_name" in frame:
+                ids = ids.fillna(frame["full_name"].astype("string").str.strip())
+        else:
+            ids = frame["full_name"].astype("string").str.strip()
+        if ids.isna().any() or (ids == "").any():
+            raise ValueError("Every record needs a patient_id or full_name")
+        keys = ids.tolist()
+        full_names = frame["full_name"].astype(object).where(frame["full_name"].notna(), None).tolist() \
+            if "full_name" in frame else [None] * len(frame)
+        names = {}
+        for key, full_name in zip(keys, full_names):
+            names[key] = full_name or names.get(key)
+
+        dates = pd.to_datetime(frame["visit_date"])
+        # Day ordinals: days since 1970-01-01 plus the ordinal of that date
+        days = (dates.dt.normalize() - pd.Timestamp("1970-01-01")).dt.days + datetime.date(1970, 1, 1).toordinal()
+
+        columns = [keys, days.tolist()]
+        for name, kind in VISIT_FIELDS:
+            if name not in frame:
+                columns.append([None] * len(frame))
+                continue
+            values = frame[name]
+            if name in CHOICES:
+                codes = pd.Categorical(values, categories=CHOICES[name]).codes
+                unknown = (codes == -1) & values.notna().to_numpy()
+                if unknown.any():
+                    raise ValueError(f"Unknown {name} {values[unknown].iloc[0]!r}; expected one of {CHOICES[name]}")
+                values = pd.Series(codes, index=frame.index).where(codes != -1)
+            elif kind == "TEXT":
+                values = values.astype(object).where(values.notna() & (values != ""))
+            columns.append([None if v != v else (int(v) if kind == "INTEGER" else v)
+                            for v in values.astype(object).tolist()])
+        return names, list(zip(*columns))
+
+    def _write_chat(self, session, messages):
+        conn = self._write_conn
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO chat_messages VALUES (?, ?, ?, ?)",
+                             ((session, seq, role, content) for seq, role, content in messages))
+        return len(messages)
+
+    def save_chat(self, session, messages):
+        """Store (seq, role, content) chat messages of one app session; returns a Future."""
+        return self._writer.submit(self._write_chat, str(session), list(messages))
+
+    # --- reads ---
+
+    @staticmethod
+    def _patient_id(conn, key):
+        row = conn.execute("SELECT id FROM patients WHERE patient_key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def history(self, key, start=None, end=None, fields=None):
+        """Visits of one patient between `start` and `end` (inclusive), oldest first.
+
+        Each visit is a dict with `visit_date` (ISO string) and the requested
+        `fields` (default: all visit fields), categoricals decoded.
+        """
+        fields = list(fields or VISIT_COLUMNS)
+        unknown = set(fields) - set(VISIT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown visit fields: {sorted(unknown)}")
+        with self._reader() as conn:
+            patient = self._patient_id(conn, key)
+            if patient is None:
+                return []
+            rows = conn.execute(
+                f"SELECT visit_date, {', '.join(fields)} FROM visits "
+                f"WHERE patient = ? AND visit_date BETWEEN ? AND ? ORDER BY visit_date",
+                (patient, _day(start) if start else 0, _day(end) if end else sys.maxsize),
+            ).fetchall()
+        return [{"visit_date": datetime.date.fromordinal(row[0]).isoformat(),
+                 **{f: _decode(f, v) for f, v in zip(fields, row[1:])}} for row in rows]
+
+    def series(self, key, start=None, end=None, fields=DIABETES_SERIES):
+        """Column-wise time series for charts: {"visit_date": [...], field: [...]}."""
+        visits = self.history(key, start, end, fields)
+        return {name: [v[name] for v in visits] for name in ["visit_date", *fields]}
+
+    def latest(self, key):
+        """The patient's most recent visit as a patient_details dict, or None."""
+        with self._reader() as conn:
+            patient = self._patient_id(conn, key)
+            if patient is None:
+                return None
+            row = conn.execute(f"SELECT visit_date, {', '.join(VISIT_COLUMNS)} FROM visits WHERE patient = ? "
+                               f"ORDER BY visit_date DESC LIMIT 1", (patient,)).fetchone()
+            if row is None:
+                return None
+            full_name = conn.execute("SELECT full_name FROM patients WHERE id = ?", (patient,)).fetchone()[0]
+        details = {c: _decode(c, v) for c, v in zip(VISIT_COLUMNS, row[1:]) if v is not None}
+        details["full_name"] = full_name or ""
+        details["visit_date"] = datetime.date.fromordinal(row[0]).isoformat()
+        return details
+
+    def visits_between(self, start, end, fields=DIABETES_SERIES):
+        """(patient_key, visit_date, *fields) rows for every patient in a date range."""
+        with self._reader() as conn:
+            rows = conn.execute(
+                f"SELECT p.patient_key, v.visit_date, {', '.join('v.' + f for f in fields)} "
+                f"FROM visits v JOIN patients p ON p.id = v.patient "
+                f"WHERE v.visit_date BETWEEN ? AND ? ORDER BY v.visit_date",
+                (_day(start), _day(end)),
+            ).fetchall()
+        return [(key, datetime.date.fromordinal(day).isoformat(), *values) for key, day, *values in rows]
+
+    def chat_messages(self, session, start=0, end=None):
+        """(seq, role, content) of one session's stored chat messages with start <= seq < end."""
+        with self._reader() as conn:
+            return conn.execute(
+                "SELECT seq, role, content FROM chat_messages WHERE session = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (str(session), start, sys.maxsize if end is None else end),
+            ).fetchall()
+
+    def stats(self):
+        with self._reader() as conn:
+            return {
+                "path": self.path,
+                "patients": conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0],
+                "visits": conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0],
+            }
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._write_conn.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path="patients.db"):
+    """Return the process-wide store for `path`, creating it on first use."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = PatientStore(key)
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local patient record store.")
+    parser.add_argument("--db", default=os.environ.get("HEALTHCARE_PATIENT_DB", "patients.db"),
+                        help="SQLite database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Bulk-import historical visits from CSV or Parquet")
+    importer.add_argument("input", help="File with patient_id (or full_name), visit_date and visit fields")
+    importer.add_argument("--chunk-size", type=int, default=50000, help="Rows read and written per batch")
+    history = commands.add_parser("history", help="Print one patient's diabetes readings")
+    history.add_argument("patient", help="Patient ID or full name")
+    history.add_argument("--start", help="First visit date (YYYY-MM-DD)")
+    history.add_argument("--end", help="Last visit date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    store = PatientStore(args.db)
+    if args.command == "import":
+        from scoring import iter_chunks
+
+        start = time.perf_counter()
+        written = store.import_frame(iter_chunks(args.input, args.chunk_size))
+        elapsed = time.perf_counter() - start
+        print(f"Imported {written} visits in {elapsed:.2f}s ({written / elapsed if elapsed else 0:.0f} rows/s); "
+              f"store now has {store.stats()['patients']} patients, {store.stats()['visits']} visits")
+    else:
+        print("\t".join(["visit_date", *DIABETES_SERIES]))
+        for visit in store.history(args.patient, args.start, args.end, DIABETES_SERIES):
+            print("\t".join(str(visit[k]) for k in ["visit_date", *DIABETES_SERIES]))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
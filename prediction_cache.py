@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+
+class PredictionCache:
+    """Bounded LRU cache of predictions keyed on the encoded feature vector.
+
+    Keys combine a hash of the feature bytes with the model version, so a
+    reloaded model never serves stale results; `invalidate` additionally
+    frees the old entries when the loader swaps models. Safe to share across
+    Streamlit sessions (threads).
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(features, model_version=None):
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        digest = hashlib.blake2b(features.tobytes(), digest_size=16)
+        digest.update(str(features.shape).encode())
+        digest.update(str(model_version).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                metrics.count("prediction_cache_miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.count("prediction_cache_hit")
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            # Computed outside the lock: two sessions may race on the same key,
+            # which only costs a duplicate evaluation
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Process-wide cache shared by every session
+prediction_cache = PredictionCache()
@@ -0,0 +1,212 @@
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from metrics import span
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FreeSerif.ttf")
+
+# (heading, [(label, patient field, unit)]) in the order they appear in the report
+REPORT_SECTIONS = [
+    ("Patient Information", [
+        ("Full Name", "full_name", ""),
+        ("Age", "age", ""),
+        ("Gender", "gender", ""),
+    ]),
+    ("Health Metrics", [
+        ("Blood Pressure", "blood_pressure", " mmHg"),
+        ("Cholesterol", "cholesterol", " mg/dL"),
+        ("BMI", "bmi", ""),
+        ("Glucose Level", "glucose", " mg/dL"),
+        ("Heart Rate", "heart_rate", " bpm"),
+        ("Oxygen Saturation", "oxygen_saturation", " %"),
+    ]),
+    ("Lifestyle Habits", [
+        ("Smoking Status", "smoking_status", ""),
+        ("Alcohol Consumption", "alcohol_consumption", ""),
+        ("Physical Activity", "physical_activity", ""),
+        ("Family History", "family_history", ""),
+        ("Diet", "diet", ""),
+        ("Sleep Hours", "sleep_hours", ""),
+        ("Stress Level", "stress_level", ""),
+        ("Waist Circumference", "waist_circumference", " cm"),
+        ("Hip Circumference", "hip_circumference", " cm"),
+    ]),
+    ("Diabetes Tracker", [
+        ("Fasting Blood Sugar", "fasting_blood_sugar", " mg/dL"),
+        ("Post-Meal Blood Sugar", "post_meal_blood_sugar", " mg/dL"),
+        ("HbA1c", "hba1c", " %"),
+    ]),
+]
+
+
+_FIELD_LABELS = {key: text for _, fields in REPORT_SECTIONS for text, key, _ in fields}
+
+
+def field_label(key):
+    """Display name of a patient field, e.g. "glucose" -> "Glucose Level"."""
+    return _FIELD_LABELS.get(key) or key.replace("_", " ").title()
+
+
+def _value(patient, key):
+    value = patient.get(key, "N/A")
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "N/A"
+    return value
+
+
+@lru_cache(maxsize=None)
+def _fpdf2():
+    import fpdf
+
+    return int(str(getattr(fpdf, "__version__", "1")).split(".")[0]) >= 2
+
+
+def _is_latin1(text):
+    try:
+        text.encode("latin1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def report_lines(patient, label, proba, factors=()):
+    """The report body as a list of lines; None marks a blank spacer line.
+
+    `factors` are (field, log-odds contribution) pairs, as returned by
+    `explain.top_factors`.
+    """
+    lines = [None]
+    for heading, fields in REPORT_SECTIONS:
+        lines.append(f"{heading}:")
+        for text, key, unit in fields:
+            value = _value(patient, key)
+            lines.append(f"{text}: {value}{unit if value != 'N/A' else ''}")
+        lines.append(None)
+    lines += [
+        "Diagnosis Results:",
+        f"Diagnosis: {'High Risk of Disease' if label == 1 else 'Low Risk of Disease'}",
+        f"Low Risk Probability: {proba[0]:.2f}",
+        f"High Risk Probability: {proba[1]:.2f}",
+    ]
+    if factors:
+        lines += [None, "Main Factors (contribution to risk log-odds):"]
+        lines += [f"{field_label(name)}: {value:+.2f} ({'raises' if value > 0 else 'lowers'} risk)"
+                  for name, value in factors]
+    return lines
+
+
+@span("pdf_build")
+def build_report(patient, label, proba, font_path=FONT_PATH, factors=()):
+    """Render the healthcare analysis report for one patient as PDF bytes.
+
+    Latin-1 text uses the built-in Helvetica font, which needs no embedding.
+    Reports containing other characters (e.g. non-Latin names) embed the
+    bundled FreeSerif font instead; parsing and subsetting it costs roughly
+    ten times more, so it is only paid when needed.
+    """
+    from fpdf import FPDF
+
+    lines = report_lines(patient, label, proba, factors)
+    pdf = FPDF()
+    pdf.add_page()
+    if all(line is None or _is_latin1(line) for line in lines) or not os.path.exists(font_path):
+        family, title_style = "helvetica", "BU"
+    else:
+        if _fpdf2():
+            pdf.add_font("FreeSerif", "", font_path)
+        else:
+            pdf.add_font("FreeSerif", "", font_path, uni=True)
+        family, title_style = "FreeSerif", "U"  # no bold face is bundled
+
+    # Title
+    pdf.set_font(family, style=title_style, size=12)
+    pdf.cell(200, 10, "Healthcare Analysis Report", align="C")
+    pdf.ln(10)
+    pdf.set_font(family, size=12)
+
+    for line in lines:
+        if line is not None:
+            pdf.cell(200, 10, line)
+        pdf.ln(10)
+
+    if _fpdf2():
+        return bytes(pdf.output())
+    return pdf.output(dest="S").encode("latin1")
+
+
+_REPORT_FIELDS = [key for _, fields in REPORT_SECTIONS for _, key, _ in fields]
+
+
+def _report_key(patient):
+    # Only the fields printed in the report affect the rendered bytes
+    return tuple(str(_value(patient, key)) for key in _REPORT_FIELDS)
+
+
+@lru_cache(maxsize=256)
+def _render_cached(key, label, proba, factors):
+    return build_report(dict(zip(_REPORT_FIELDS, key)), label, proba, factors=factors)
+
+
+@span("pdf_render")
+def render_report(patient, label, proba, factors=()):
+    """Cached `build_report`: unchanged patient data and prediction reuse the bytes."""
+    factors = tuple((name, round(float(value), 2)) for name, value in factors)
+    return _render_cached(_report_key(patient), int(label), (round(float(proba[0]), 2), round(float(proba[1]), 2)),
+                          factors)
+
+
+def report_cache_info():
+    return _render_cached.cache_info()
+
+
+def _render_row(args):
+    path, patient, label, proba = args
+    with open(path, "wb") as f:
+        f.write(build_report(patient, label, proba))
+    return path
+
+
+def render_cohort(scored_path, out_dir, id_column=None, workers=None, chunk_size=10000):
+    """Render one PDF per row of a scored cohort (the output of `scoring.py`).
+
+    Rows are streamed in chunks and rendered on a process pool; each file is
+    named after `id_column` (or the row number). Returns the number written.
+    """
+    from scoring import iter_chunks
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for chunk in iter_chunks(scored_path, chunk_size):
+            probability_columns = sorted(c for c in chunk.columns if c.startswith("probability_"))
+            jobs = []
+            for position, row in enumerate(chunk.to_dict("records")):
+                name = row[id_column] if id_column else written + position
+                proba = [row[c] for c in probability_columns]
+                jobs.append((os.path.join(out_dir, f"{name}.pdf"), row, int(row["prediction"]), proba))
+            for _ in pool.map(_render_row, jobs, chunksize=64):
+                written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PDF reports for a scored patient cohort.")
+    parser.add_argument("scored", help="CSV or Parquet file written by scoring.py")
+    parser.add_argument("out_dir", help="Directory to write one PDF per patient into")
+    parser.add_argument("--id-column", help="Column used to name each report (default: row number)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = render_cohort(args.scored, args.out_dir, args.id_column, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {count} reports in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.1f} reports/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from metrics import span
+from features import DEFAULT_SCHEMA, load_schema, model_columns
+from model_loader import load_model
+from tree_engine import CompiledEnsemble, accelerate
+
+
+def score(model, features):
+    """Return (labels, probabilities) from a single `predict_proba` pass."""
+    if isinstance(features, np.ndarray) and not isinstance(model, CompiledEnsemble) \
+            and getattr(model, "feature_names_in_", None) is not None:
+        # sklearn estimators fitted on a DataFrame expect named columns
+        import pandas as pd
+
+        with span("input_frame"):
+            features = pd.DataFrame(features, columns=model.feature_names_in_)
+    with span("predict_proba"):
+        proba = model.predict_proba(features)
+    labels = np.asarray(model.classes_)[proba.argmax(axis=1)]
+    return labels, proba
+
+
+def score_records(model, records, schema=None, monitor=None):
+    # Raw patient records in, one output frame with predictions appended;
+    # `monitor` (a drift_monitor.DriftMonitor) also sees the encoded rows
+    schema = schema or DEFAULT_SCHEMA.select(model_columns(model))
+    features = schema.encode_frame(records)
+    labels, proba = score(model, features)
+    if monitor is not None:
+        monitor.observe(features)
+    result = records.copy()
+    result["prediction"] = labels
+    for i, cls in enumerate(model.classes_):
+        result[f"probability_{cls}"] = proba[:, i]
+    return result
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def iter_chunks(path, chunk_size, columns=None):
+    """Stream a CSV or Parquet file as DataFrames of at most `chunk_size` rows.
+
+    With `columns`, only those of them present in the file are read.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [c for c in parquet.schema_arrow.names if c in set(columns)]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        usecols = None if columns is None else set(columns).__contains__
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=usecols)
+
+
+class _Writer:
+    # Appends scored chunks to CSV or Parquet without holding earlier chunks
+    def __init__(self, path):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._writer = None
+        self._header = True
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+_worker_model_path = None
+_worker_compiled = False
+
+
+def _load(model_path, compiled):
+    model = load_model(model_path)
+    return accelerate(model) if compiled else model
+
+
+def _init_worker(model_path, compiled):
+    global _worker_model_path, _worker_compiled
+    _worker_model_path = model_path
+    _worker_compiled = compiled
+    _load(model_path, compiled)  # warm the per-process model cache once
+
+
+def _score_chunk(records):
+    # Returns the chunk's drift counts too; the parent merges them into its monitor
+    from drift_monitor import get_monitor
+
+    model = _load(_worker_model_path, _worker_compiled)
+    monitor = get_monitor(_worker_model_path, publish=False)
+    result = score_records(model, records, load_schema(_worker_model_path, model), monitor)
+    return result, monitor.take() if monitor is not None else None
+
+
+def score_file(input_path, output_path, model_path, chunk_size=50000, workers=None, compiled=False):
+    """Score every patient in `input_path` and write the results to `output_path`.
+
+    Chunks are scored on a process pool (one model copy per worker) and written
+    in input order as they complete. At most two chunks per worker are in flight,
+    so memory stays bounded regardless of the input size. With `compiled`, rows
+    are scored by the flattened tree engine instead of sklearn. Returns the
+    row count.
+
+    When the model has a drift reference profile, every scored row also
+    updates the process-wide monitor (`drift_monitor.get_monitor`).
+    """
+    from drift_monitor import get_monitor
+
+    workers = workers or os.cpu_count() or 1
+    monitor = get_monitor(model_path)
+    writer = _Writer(output_path)
+    rows = 0
+
+    def collect(future):
+        result, drift = future.result()
+        if monitor is not None and drift is not None:
+            monitor.merge(*drift)
+        writer.write(result)
+        return len(result)
+
+    try:
+        if workers == 1:
+            model = _load(model_path, compiled)
+            schema = load_schema(model_path, model)
+            for chunk in iter_chunks(input_path, chunk_size):
+                writer.write(score_records(model, chunk, schema, monitor))
+                rows += len(chunk)
+            return rows
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path, compiled)) as pool:
+            pending = []
+            for chunk in iter_chunks(input_path, chunk_size):
+                pending.append(pool.submit(_score_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    rows += collect(pending.pop(0))
+            for future in pending:
+                rows += collect(future)
+        return rows
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a cohort of patients from a CSV or Parquet file.")
+    parser.add_argument("input", help="CSV or Parquet file with one patient per row")
+    parser.add_argument("output", help="CSV or Parquet file to write predictions to")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--compiled", action="store_true", help="Score with the flattened tree engine")
+    parser.add_argument("--drift-report", metavar="JSON",
+                        help="Write the input drift report against the model's training profile here")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = score_file(args.input, args.output, args.model, args.chunk_size, args.workers, args.compiled)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} patients in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)", file=sys.stderr)
+    if args.drift_report:
+        from drift_monitor import get_monitor, print_report
+
+        monitor = get_monitor(args.model)
+        if monitor is None:
+            print(f"No drift profile for {args.model}; train it again or run drift_monitor.py profile",
+                  file=sys.stderr)
+        else:
+            report = monitor.report()
+            with open(args.drift_report, "w") as f:
+                json.dump(report, f, indent=2)
+            print_report(report, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# Diabetes risk from any one reading at or above the threshold (ADA criteria):
+# (fasting mg/dL, post-meal mg/dL, HbA1c %). Codes: 0 normal, 1 prediabetes,
+# 2 high risk, -1 when no reading is available.
+PREDIABETES_THRESHOLDS = (100.0, 140.0, 5.7)
+DIABETES_THRESHOLDS = (126.0, 200.0, 6.5)
+DIABETES_LABELS = ["normal", "prediabetes", "high risk"]
+
+# BMI category boundaries (WHO): codes 0 underweight, 1 normal, 2 overweight,
+# 3 obese, -1 when weight or height is missing
+BMI_EDGES = (18.5, 25.0, 30.0)
+BMI_LABELS = ["underweight", "normal", "overweight", "obese"]
+
+# Input columns read by `screen_frame`/`screen_file` by default
+DEFAULT_COLUMNS = {
+    "fasting": "fasting_blood_sugar",
+    "post_meal": "post_meal_blood_sugar",
+    "hba1c": "hba1c",
+    "weight": "weight",
+    "height": "height",
+    "bmi": "bmi",
+}
+
+
+def _float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def diabetes_risk(fasting, post_meal, hba1c):
+    """Diabetes risk code for each row (a 0-d array for scalar inputs).
+
+    High risk implies every prediabetes condition, so the code is simply
+    the number of threshold tiers reached. Missing readings (NaN) never
+    trigger a tier.
+    """
+    fasting, post_meal, hba1c = _float(fasting), _float(post_meal), _float(hba1c)
+    pre_f, pre_p, pre_h = PREDIABETES_THRESHOLDS
+    high_f, high_p, high_h = DIABETES_THRESHOLDS
+    codes = np.array((fasting >= pre_f) | (post_meal >= pre_p) | (hba1c >= pre_h), dtype=np.int8)
+    codes += (fasting >= high_f) | (post_meal >= high_p) | (hba1c >= high_h)
+    missing = np.isnan(fasting) & np.isnan(post_meal) & np.isnan(hba1c)
+    if missing.any():
+        codes[missing] = -1
+    return codes
+
+
+def bmi(weight_kg, height_cm):
+    """Body-mass index rounded to 2 decimals, as the app displays it."""
+    height_m = _float(height_cm) / 100.0
+    return np.round(_float(weight_kg) / (height_m * height_m), 2)
+
+
+def bmi_category(values):
+    """BMI category code for each BMI value."""
+    values = _float(values)
+    codes = np.array(np.searchsorted(BMI_EDGES, values, side="right"), dtype=np.int8)
+    missing = np.isnan(values)
+    if missing.any():
+        codes[missing] = -1
+    return codes
+
+
+def label(codes, labels):
+    """Label for a single code, e.g. `label(diabetes_risk(...), DIABETES_LABELS)`."""
+    code = int(codes)
+    return labels[code] if code >= 0 else "unknown"
+
+
+def screen_frame(frame, columns=DEFAULT_COLUMNS):
+    """Diabetes risk and BMI category for every row of a DataFrame.
+
+    Rows need any of the diabetes readings and either weight (kg) and height
+    (cm) or a precomputed BMI. Returns a DataFrame with `diabetes_risk`,
+    `bmi` and `bmi_category` (categoricals; missing inputs give NaN).
+    """
+    import pandas as pd
+
+    def column(name):
+        source = columns.get(name)
+        if source in frame:
+            return frame[source].to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.full(len(frame), np.nan)
+
+    risk = diabetes_risk(column("fasting"), column("post_meal"), column("hba1c"))
+    if columns.get("weight") in frame and columns.get("height") in frame:
+        values = bmi(column("weight"), column("height"))
+    else:
+        values = column("bmi")
+    return pd.DataFrame({
+        "diabetes_risk": pd.Categorical.from_codes(risk, DIABETES_LABELS),
+        "bmi": values,
+        "bmi_category": pd.Categorical.from_codes(bmi_category(values), BMI_LABELS),
+    }, index=frame.index)
+
+
+def screen_file(input_path, output_path=None, chunk_size=500000, columns=DEFAULT_COLUMNS):
+    """Screen every row of a CSV or Parquet file in one streaming pass.
+
+    With `output_path`, the input rows are written back with the screening
+    columns appended (CSV or Parquet by extension). Without it, only the
+    columns the rules need are read and just the counts are computed.
+    Returns (rows, {"diabetes_risk": counts, "bmi_category": counts}).
+    """
+    from scoring import _Writer, iter_chunks
+
+    counts = {"diabetes_risk": np.zeros(len(DIABETES_LABELS) + 1, dtype=np.int64),
+              "bmi_category": np.zeros(len(BMI_LABELS) + 1, dtype=np.int64)}
+    writer = _Writer(output_path) if output_path else None
+    rows = 0
+    try:
+        for chunk in iter_chunks(input_path, chunk_size, columns=None if writer else list(columns.values())):
+            result = screen_frame(chunk, columns)
+            for name in counts:
+                # Shift by one so "unknown" (-1) lands in the last bin
+                counts[name] += np.bincount(result[name].cat.codes.to_numpy() + 1,
+                                            minlength=len(counts[name]))[np.r_[1:len(counts[name]), 0]]
+            if writer:
+                writer.write(chunk.join(result, rsuffix="_screened"))
+            rows += len(chunk)
+    finally:
+        if writer:
+            writer.close()
+    summary = {
+        "diabetes_risk": dict(zip(DIABETES_LABELS + ["unknown"], counts["diabetes_risk"].tolist())),
+        "bmi_category": dict(zip(BMI_LABELS + ["unknown"], counts["bmi_category"].tolist())),
+    }
+    return rows, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen a population file for diabetes risk and BMI category.")
+    parser.add_argument("input", help="CSV or Parquet file with diabetes readings and weight/height or BMI")
+    parser.add_argument("output", nargs="?", help="Where to write the screened rows (omit for counts only)")
+    parser.add_argument("--chunk-size", type=int, default=500000, help="Rows per chunk")
+    for name, default in DEFAULT_COLUMNS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-column", default=default,
+                            help=f"Input column for {name.replace('_', ' ')} (default: {default})")
+    args = parser.parse_args(argv)
+
+    columns = {name: getattr(args, f"{name}_column") for name in DEFAULT_COLUMNS}
+    start = time.perf_counter()
+    rows, summary = screen_file(args.input, args.output, args.chunk_size, columns)
+    elapsed = time.perf_counter() - start
+    print(f"Screened {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+    for name, counts in summary.items():
+        print(f"{name}:")
+        for category, count in counts.items():
+            print(f"  {category:<12}{count:>12}  {count / rows if rows else 0:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AIML_streamlit_app.py")
+
+# Modules that dominate cold start when imported eagerly; the app should only
+# pull them in from the step that needs them
+HEAVY_MODULES = ["pandas", "sklearn", "joblib", "fpdf", "pyarrow", "transformers", "matplotlib", "seaborn",
+                 "langdetect"]
+
+
+class StartupTimer:
+    """Wall time of the named stages of one app run.
+
+    Unlike training_data.StageProfiler it does not track memory, so it is
+    cheap enough to leave on in production. `heavy_modules()` lists which of
+    HEAVY_MODULES the process has imported so far.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "seconds": time.perf_counter() - start})
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    @staticmethod
+    def heavy_modules():
+        return [name for name in HEAVY_MODULES if name in sys.modules]
+
+    def report(self, file=sys.stdout):
+        for s in self.stages:
+            print(f"{s['stage']:<24}{s['seconds'] * 1000:>10.1f} ms", file=file)
+        print(f"{'Total':<24}{self.total * 1000:>10.1f} ms", file=file)
+
+
+def parse_importtime(output):
+    """Parse `python -X importtime` output into one dict per imported module.
+
+    `self_us` excludes and `cumulative_us` includes the module's own imports;
+    `depth` is 0 for modules imported directly by the profiled code.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # column header
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                        "depth": max(depth, 0)})
+    return entries
+
+
+def import_costs(modules, python=sys.executable, cwd=None):
+    """Per-module import cost of `modules`, measured in a fresh interpreter."""
+    code = "\n".join(f"import {m}" for m in modules)
+    result = subprocess.run([python, "-X", "importtime", "-c", code], cwd=cwd or os.path.dirname(APP_SCRIPT),
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return parse_importtime(result.stderr)
+
+
+_APP_RUN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter()
+app.run()
+seconds = time.perf_counter() - start
+print("STARTUP_RESULT " + json.dumps({"first_run_seconds": seconds, "preloaded": sorted(before),
+      "exceptions": [str(e.value) for e in app.exception]}), file=sys.stderr)
+"""
+
+
+def profile_app(script=APP_SCRIPT, python=sys.executable, env=None, cwd=None):
+    """Cold first run of the Streamlit app in a fresh, headless interpreter.
+
+    Runs from `cwd` (default: the current directory, like `streamlit run`) so
+    relative model paths resolve the same way. Returns the wall time of the
+    first script run and the import cost of every module it loaded (modules
+    already imported by Streamlit's test harness are left out).
+    """
+    script = os.path.abspath(script)
+    env = {**os.environ, **(env or {})}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(script), env.get("PYTHONPATH")]))
+    result = subprocess.run([python, "-X", "importtime", "-c", _APP_RUN, script], cwd=cwd, capture_output=True,
+                            text=True, env=env)
+    summary = None
+    for line in result.stderr.splitlines():
+        if line.startswith("STARTUP_RESULT "):
+            summary = json.loads(line[len("STARTUP_RESULT "):])
+    if summary is None:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "app run failed")
+    preloaded = set(summary.pop("preloaded"))
+    summary["imports"] = [e for e in parse_importtime(result.stderr) if e["module"] not in preloaded]
+    return summary
+
+
+def top_level(entries, top=None):
+    """Entries imported directly by the profiled code, most expensive first."""
+    rows = sorted((e for e in entries if e["depth"] == 0), key=lambda e: -e["cumulative_us"])
+    return rows[:top] if top else rows
+
+
+def print_costs(entries, top=20, file=sys.stdout):
+    print(f"{'Module':<40}{'Self':>12}{'Cumulative':>14}", file=file)
+    for e in top_level(entries, top):
+        print(f"{e['module']:<40}{e['self_us'] / 1000:>9.1f} ms{e['cumulative_us'] / 1000:>11.1f} ms", file=file)
+    print(f"{'Total':<40}{'':>12}{sum(e['cumulative_us'] for e in top_level(entries)) / 1000:>11.1f} ms", file=file)
+    heavy = sorted({e["module"].split(".")[0] for e in entries} & set(HEAVY_MODULES))
+    print(f"Heavy modules loaded: {', '.join(heavy) or 'none'}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the app's cold-start cost, module by module.")
+    parser.add_argument("modules", nargs="*", help="Profile importing these modules instead of running the app")
+    parser.add_argument("--app", default=APP_SCRIPT, help="Streamlit script to run headless")
+    parser.add_argument("--startup", choices=["eager", "lazy"], help="HEALTHCARE_STARTUP mode for the app run")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list")
+    parser.add_argument("--output", help="Also write the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.modules:
+        results = {"imports": import_costs(args.modules)}
+    else:
+        results = profile_app(args.app, env={"HEALTHCARE_STARTUP": args.startup} if args.startup else None)
+        print(f"First run: {results['first_run_seconds'] * 1000:.0f} ms")
+        for error in results["exceptions"]:
+            print(f"App raised: {error}")
+    print_costs(results["imports"], args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
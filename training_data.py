@@ -0,0 +1,283 @@
+import hashlib
+import json
+import numbers
+import os
+import resource
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from features import FeatureSchema
+
+CACHE_VERSION = 1
+
+
+def _peak_rss():
+    # Linux reports the high-water mark (resettable per stage) in /proc; elsewhere
+    # fall back to the process-lifetime peak from getrusage
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class StageProfiler:
+    """Records wall time and peak resident memory for each named stage of a run.
+
+    Peak memory is read from the kernel's RSS high-water mark rather than
+    tracemalloc, which slows chunked CSV parsing by an order of magnitude.
+    On Linux the mark is reset at the start of every stage; elsewhere it is
+    the process peak so far.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "seconds": time.perf_counter() - start, "peak_bytes": _peak_rss()})
+
+    def report(self, file=sys.stdout):
+        print(f"{'Stage':<24}{'Wall time':>12}{'Peak RSS':>16}", file=file)
+        for s in self.stages:
+            print(f"{s['stage']:<24}{s['seconds']:>11.2f}s{s['peak_bytes'] / 2**20:>13.1f} MiB", file=file)
+        print(f"{'Total':<24}{sum(s['seconds'] for s in self.stages):>11.2f}s", file=file)
+
+
+def infer_dtypes(path, categorical_columns, target, exclude=(), sample_rows=10000):
+    """Compact read dtypes inferred from the first `sample_rows` rows.
+
+    Categoricals and the target are read as `category`, integer columns as
+    int32 (int64 near the int32 range) and everything else as float64.
+    Excluded columns are not read at all. Pass explicit dtypes to
+    `prepare_cache` when later rows do not fit the sample (e.g. missing
+    values in a column that was complete in the sample).
+
+    Text columns must be listed in `categorical_columns` (or excluded): the
+    feature schema encodes every other column as a number.
+    """
+    sample = pd.read_csv(path, nrows=sample_rows)
+    dtypes = {}
+    for column in sample.columns:
+        if column in exclude:
+            continue
+        values = sample[column]
+        if column in categorical_columns or column == target:
+            dtypes[column] = "category"
+        elif not pd.api.types.is_numeric_dtype(values):
+            raise ValueError(f"Column {column!r} in {path} holds text but is not a categorical column; "
+                             f"add it to the categorical columns or exclude it")
+        elif pd.api.types.is_integer_dtype(values):
+            dtypes[column] = "int32" if values.abs().max() < 2**30 else "int64"
+        else:
+            dtypes[column] = "float64"
+    return dtypes
+
+
+def _parse_values(values):
+    # `category` columns are read as text; type their values the way a plain
+    # `pd.read_csv` (standard mode) would: numbers when every value is numeric
+    values = list(values)
+    try:
+        return pd.to_numeric(pd.Index(values, dtype=object)).tolist()
+    except (ValueError, TypeError):
+        return values
+
+
+def _as_categories(values, categories):
+    """A `category` column read as text, converted to the type of `categories` so its codes match."""
+    if not isinstance(values.dtype, pd.CategoricalDtype) or not categories:
+        return values
+    if not all(isinstance(c, numbers.Number) for c in categories):
+        return values
+    numeric = pd.to_numeric(values.cat.categories, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.Series(np.append(numeric, np.nan)[values.cat.codes], index=values.index)
+
+
+def check_encoding(path, schema, classes, target, encoded, labels):
+    """Raise ValueError unless the first rows of `path` encode like standard mode.
+
+    Standard mode reads the CSV without dtypes and encodes it with the schema;
+    its target numbering is the order of `classes` (sorted, as a LabelEncoder
+    numbers them, unless a model's classes were passed in). `encoded` and
+    `labels` are the chunked encoding of the same leading rows.
+    """
+    sample = pd.read_csv(path, nrows=len(encoded))
+    expected = schema.encode_array(sample)
+    for i, column in enumerate(schema.columns):
+        if not np.array_equal(expected[:, i], encoded[:, i], equal_nan=True):
+            raise ValueError(f"Column {column!r} of {path} encodes differently when read in chunks "
+                             f"than in standard mode")
+    if not np.array_equal(pd.Categorical(sample[target], categories=classes).codes, labels):
+        raise ValueError(f"Target {target!r} of {path} is numbered differently when read in chunks "
+                         f"than in standard mode (classes {list(classes)})")
+
+
+def _fingerprint(path, **params):
+    stat = os.stat(path)
+    payload = json.dumps({"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns,
+                          "version": CACHE_VERSION, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class TrainingCache:
+    """Preprocessed training data stored as memory-mapped `.npy` files.
+
+    `X_train`/`X_test` are float64 row-major arrays: sklearn's estimators
+    accept them without copying, so pages are read from disk on demand
+    instead of being held as private memory. Layout of `directory`:
+    `X_train.npy`, `y_train.npy`, `X_test.npy`, `y_test.npy`, `schema.json`
+    and `meta.json` (target classes, row counts, source fingerprint).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.schema = FeatureSchema.load(os.path.join(directory, "schema.json"))
+        self.classes = np.asarray(self.meta["classes"])
+
+    def array(self, name):
+        return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+
+    @property
+    def X_train(self):
+        return self.array("X_train")
+
+    @property
+    def y_train(self):
+        return self.array("y_train")
+
+    @property
+    def X_test(self):
+        return self.array("X_test")
+
+    @property
+    def y_test(self):
+        return self.array("y_test")
+
+    @property
+    def columns(self):
+        return self.schema.columns
+
+
+def prepare_cache(path, categorical_columns, target, exclude=(), cache_dir=".cache/training",
+                  chunk_size=100000, test_size=0.2, random_state=42, profiler=None, dtypes=None,
+                  schema=None, classes=None):
+    """Preprocess a CSV too large for memory into a reusable `TrainingCache`.
+
+    Pass 1 streams the file with compact dtypes to count rows and collect the
+    values of each categorical column and the target. Pass 2 streams it again,
+    encodes each chunk with the resulting `FeatureSchema` and writes it straight
+    into the train/test memory maps. Only one chunk is in memory at a time. A
+    cache built from the same file and settings is reused without reading the
+    CSV.
+
+    Pass an existing `schema` and target `classes` (e.g. from a previous run)
+    to encode new data exactly like the data a model was trained on; target
+    values outside `classes` are an error. The first chunk is checked against
+    the standard mode's encoding of the same rows (`check_encoding`).
+    """
+    profiler = profiler or StageProfiler()
+    exclude = set(exclude) | {target}
+    key = _fingerprint(path, categorical=sorted(categorical_columns), target=target, exclude=sorted(exclude),
+                       test_size=test_size, random_state=random_state, dtypes=dtypes,
+                       schema=schema.to_dict() if schema is not None else None, classes=classes)
+    directory = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        with profiler.stage("load cache"):
+            return TrainingCache(directory)
+
+    with profiler.stage("scan (pass 1)"):
+        dtypes = dtypes or infer_dtypes(path, categorical_columns, target, exclude - {target})
+        usecols = list(dtypes)
+        categories = {column: set() for column in categorical_columns}
+        target_values = set()
+        n_rows = 0
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+            n_rows += len(chunk)
+            for column in categorical_columns if schema is None else ():
+                categories[column].update(chunk[column].dropna().unique().tolist())
+            target_values.update(chunk[target].dropna().unique().tolist())
+        if schema is None:
+            columns = [c for c in usecols if c not in exclude]
+            schema = FeatureSchema.from_categories(columns, {c: _parse_values(v) for c, v in categories.items()})
+        target_values = set(_parse_values(target_values))
+        if classes is None:
+            classes = sorted(target_values)
+        else:
+            classes = _parse_values(classes)
+        if target_values - set(classes):
+            raise ValueError(f"Target values {sorted(target_values - set(classes), key=str)} in {path} "
+                             f"are not among the model's classes {list(classes)}")
+
+    with profiler.stage("encode (pass 2)"):
+        tmp = directory + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        is_test = np.random.default_rng(random_state).random(n_rows) < test_size
+        n_test = int(is_test.sum())
+        n_features = len(schema.columns)
+        y_dtype = np.int8 if len(classes) < 128 else np.int32
+        X_train = np.lib.format.open_memmap(os.path.join(tmp, "X_train.npy"), "w+", np.float64, (n_rows - n_test, n_features))
+        X_test = np.lib.format.open_memmap(os.path.join(tmp, "X_test.npy"), "w+", np.float64, (n_test, n_features))
+        y_train = np.lib.format.open_memmap(os.path.join(tmp, "y_train.npy"), "w+", y_dtype, (n_rows - n_test,))
+        y_test = np.lib.format.open_memmap(os.path.join(tmp, "y_test.npy"), "w+", y_dtype, (n_test,))
+
+        offset = train_pos = test_pos = 0
+        buffer = np.empty((chunk_size, n_features), dtype=np.float64)
+        coded = [(f["source"], f["categories"]) for f in schema.features if f["kind"] == "code"]
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+            n = len(chunk)
+            for column, column_categories in coded:
+                if column in chunk:
+                    chunk[column] = _as_categories(chunk[column], column_categories)
+            encoded = schema.encode_array(chunk, out=buffer[:n])
+            labels = pd.Categorical(_as_categories(chunk[target], classes), categories=classes).codes
+            if offset == 0:
+                check_encoding(path, schema, classes, target, encoded[:1000], labels[:1000])
+            mask = is_test[offset:offset + n]
+            n_chunk_test = int(mask.sum())
+            X_test[test_pos:test_pos + n_chunk_test] = encoded[mask]
+            y_test[test_pos:test_pos + n_chunk_test] = labels[mask]
+            X_train[train_pos:train_pos + n - n_chunk_test] = encoded[~mask]
+            y_train[train_pos:train_pos + n - n_chunk_test] = labels[~mask]
+            offset += n
+            test_pos += n_chunk_test
+            train_pos += n - n_chunk_test
+        for array in (X_train, X_test, y_train, y_test):
+            array.flush()
+        del X_train, X_test, y_train, y_test
+
+        schema.save(os.path.join(tmp, "schema.json"))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"version": CACHE_VERSION, "source": os.path.abspath(path), "target": target,
+                       "classes": classes, "rows": n_rows, "train_rows": n_rows - n_test, "test_rows": n_test,
+                       "dtypes": dtypes}, f, indent=2, default=str)
+        # Publish the finished cache in one step so an interrupted run is never reused
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp, directory)
+
+    return TrainingCache(directory)
@@ -0,0 +1,260 @@
+import argparse
+import sys
+import time
+import weakref
+
+import numpy as np
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class CompiledEnsemble:
+    """A fitted `GradientBoostingClassifier` flattened into contiguous arrays.
+
+    Every tree's nodes live in the same `feature`, `threshold`, `left`,
+    `right` and `value` arrays; `roots` holds the index of each tree's first
+    node. Leaves point at themselves, so all trees can be walked together one
+    level at a time for a whole batch. Leaf values are pre-scaled by the
+    learning rate, and `baseline` is the raw score of the init estimator.
+    `cover`, when known, is each node's weighted training sample count
+    (used by explain.py to attribute predictions to features).
+
+    Exposes `predict`, `predict_proba`, `decision_function`, `classes_` and
+    `feature_names_in_`, so it can stand in for the estimator when scoring.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, roots,
+                 tree_class, baseline, classes, feature_names, max_depth, loss="log_loss", children=None,
+                 cover=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        self.tree_class = tree_class
+        self.baseline = baseline
+        self.cover = cover
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object) if feature_names is not None else None
+        self.max_depth = int(max_depth)
+        self.loss = loss
+        self.n_raw = len(baseline)
+        self._has_missing = bool(missing_left.any())
+        # Interleaved (left, right) pairs so one gather picks the next node
+        self._children = np.stack([left, right], axis=1).ravel() if children is None else children
+
+    @property
+    def children(self):
+        return self._children
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value,
+                                      self.missing_left, self.roots, self.tree_class, self.cover)
+                   if a is not None)
+
+    def leaves(self, X, trees=None):
+        """Leaf index reached in each tree for each row of `X` (n_rows, n_trees)."""
+        roots = self.roots if trees is None else self.roots[trees]
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        idx = np.broadcast_to(roots.astype(np.intp), (n_rows, len(roots))).copy()
+        missing = self._has_missing and np.isnan(flat).any()
+        for _ in range(self.max_depth):
+            x = flat.take(row_offset + self.feature.take(idx))
+            if missing:
+                go_right = ~(x <= self.threshold.take(idx)) & ~(np.isnan(x) & self.missing_left.take(idx))
+            else:
+                go_right = x > self.threshold.take(idx)
+            idx = self._children.take(2 * idx + go_right)
+        return idx
+
+    def decision_function(self, X, block_size=256):
+        X = self._as_array(X)
+        raw = np.empty((len(X), self.n_raw), dtype=np.float64)
+        for start in range(0, len(X), block_size):
+            block = X[start:start + block_size]
+            raw[start:start + block_size] = self._raw_block(block)
+        return raw[:, 0] if self.n_raw == 1 else raw
+
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        if self.n_raw == 1:
+            p = _expit(2.0 * raw) if self.loss == "exponential" else _expit(raw)
+            return np.column_stack([1.0 - p, p])
+        raw = raw - raw.max(axis=1, keepdims=True)
+        e = np.exp(raw)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def _raw_block(self, X):
+        # Accumulate in float64 even when the leaf values are stored as float32
+        leaf_values = self.value.take(self.leaves(X))
+        if self.n_raw == 1:
+            return self.baseline + leaf_values.sum(axis=1, keepdims=True, dtype=np.float64)
+        raw = np.tile(self.baseline, (len(X), 1))
+        for k in range(self.n_raw):
+            raw[:, k] += leaf_values[:, self.tree_class == k].sum(axis=1, dtype=np.float64)
+        return raw
+
+    def _as_array(self, X):
+        # sklearn trees compare float32 features against float64 thresholds;
+        # rounding through float32 keeps the split decisions bit-for-bit identical
+        return np.ascontiguousarray(np.asarray(X, dtype=np.float32), dtype=np.float64)
+
+
+def _flatten(estimators, learning_rate):
+    """Node arrays (CompiledEnsemble keyword arguments) for an (n_stages, n_raw) array of fitted trees."""
+    n_stages, n_raw = estimators.shape
+    feature, threshold, left, right, value, missing_left, cover = [], [], [], [], [], [], []
+    roots, tree_class = [], []
+    offset = 0
+    max_depth = 0
+    for stage in range(n_stages):
+        for k in range(n_raw):
+            tree = estimators[stage, k].tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            value.append(tree.value[:, 0, 0] * learning_rate)
+            cover.append(tree.weighted_n_node_samples)
+            mgl = getattr(tree, "missing_go_to_left", None)
+            missing_left.append(np.zeros(n, dtype=bool) if mgl is None else (mgl.astype(bool) & ~is_leaf))
+            roots.append(offset)
+            tree_class.append(k)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+    return dict(
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        value=np.concatenate(value).astype(np.float64),
+        missing_left=np.concatenate(missing_left),
+        roots=np.asarray(roots, dtype=np.int32),
+        tree_class=np.asarray(tree_class, dtype=np.int32),
+        baseline=np.zeros(n_raw),
+        max_depth=max_depth,
+        cover=np.concatenate(cover).astype(np.float64),
+    )
+
+
+def compile_model(model):
+    """Flatten a fitted `GradientBoostingClassifier` into a `CompiledEnsemble`."""
+    from sklearn.ensemble import GradientBoostingClassifier
+
+    if not isinstance(model, GradientBoostingClassifier):
+        raise TypeError(f"Cannot compile {type(model).__name__}; only GradientBoostingClassifier is supported")
+
+    engine = CompiledEnsemble(
+        **_flatten(model.estimators_, model.learning_rate),
+        classes=model.classes_,
+        feature_names=getattr(model, "feature_names_in_", None),
+        loss=model.loss,
+    )
+    # The init estimator's raw score is whatever sklearn adds on top of the trees
+    probe = np.zeros((1, model.n_features_in_))
+    if engine.feature_names_in_ is not None:
+        import pandas as pd
+
+        probe = pd.DataFrame(probe, columns=list(engine.feature_names_in_))
+    engine.baseline = np.atleast_1d(model.decision_function(probe)[0]) - engine._raw_block(engine._as_array(probe))[0]
+    return engine
+
+
+_compiled = weakref.WeakKeyDictionary()
+
+
+def accelerate(model):
+    """Return the compiled engine for `model`, or `model` itself if it cannot be compiled.
+
+    Compilation happens once per model object, so a hot-reloaded model is
+    compiled again automatically and the old engine is dropped with it.
+    """
+    if isinstance(model, CompiledEnsemble):
+        return model
+    try:
+        return _compiled[model]
+    except (KeyError, TypeError):
+        pass
+    try:
+        engine = compile_model(model)
+    except TypeError:
+        return model
+    try:
+        _compiled[model] = engine
+    except TypeError:
+        pass
+    return engine
+
+
+def verify(model, X, engine=None, tolerance=1e-9):
+    """Check that the compiled engine reproduces sklearn's probabilities on `X`."""
+    engine = engine or compile_model(model)
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    max_abs_diff = float(np.abs(expected - actual).max()) if len(expected) else 0.0
+    label_agreement = float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()) if len(expected) else 1.0
+    return {
+        "rows": len(expected),
+        "max_abs_diff": max_abs_diff,
+        "label_agreement": label_agreement,
+        "passed": max_abs_diff <= tolerance and label_agreement == 1.0,
+    }
+
+
+def _time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from features import load_schema
+    from model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Compile a GradientBoostingClassifier and check it against sklearn.")
+    parser.add_argument("--model", default="healthcare_model.pkl", help="Path to the trained model")
+    parser.add_argument("--verify", metavar="CSV", required=True, help="Held-out patient records to check parity on")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="Maximum allowed probability difference")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    X = load_schema(args.model, model).encode_frame(pd.read_csv(args.verify))
+    engine = compile_model(model)
+    report = verify(model, X, engine, args.tolerance)
+    print(f"Rows checked: {report['rows']}")
+    print(f"Max |probability difference|: {report['max_abs_diff']:.3e}")
+    print(f"Label agreement: {report['label_agreement']:.4f}")
+
+    one = X.iloc[:1]
+    print(f"Single row: sklearn {_time_per_call(lambda: model.predict_proba(one), 200) * 1e6:.0f} us, "
+          f"compiled {_time_per_call(lambda: engine.predict_proba(one), 200) * 1e6:.0f} us")
+    sk = _time_per_call(lambda: model.predict_proba(X), 3)
+    fast = _time_per_call(lambda: engine.predict_proba(X), 3)
+    print(f"Batch of {len(X)}: sklearn {len(X) / sk:.0f} rows/s, compiled {len(X) / fast:.0f} rows/s")
+    print("PASS" if report["passed"] else "FAIL")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())